@@ -0,0 +1,102 @@
+"""
+Render time of the overall, sell and rent charts on a synthetic dataset, with and without the reshape cache
+of persiantext.py. The number of FontProperties made per chart is printed too: matplotlib copies the font of
+every Text, so sharing FontProperties objects between labels does not save their construction.
+
+    python benchmarks/chart_benchmark.py [--rows 3000] [--repeat 3] [--font PATH]
+
+The IRANSans font of the charts is not in the repository; the DejaVu font of matplotlib is used if it is missing.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import matplotlib.font_manager as fm
+from arabic_reshaper import ArabicReshaper
+from bidi.algorithm import get_display
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import divar_realestate_charts as charts
+import persiantext
+from normalize_benchmark import synthetic_posts, vectorized_prepare_datasets
+
+class FontPropertiesCounter:
+    """
+    Counts FontProperties objects made while it is active.
+    """
+    def __init__(self):
+        self.count = 0
+        self.__init_function__ = fm.FontProperties.__init__
+
+    def __enter__(self):
+        counter = self
+        init_function = self.__init_function__
+
+        def counting_init(font_properties, *args, **kwargs):
+            counter.count += 1
+            init_function(font_properties, *args, **kwargs)
+
+        fm.FontProperties.__init__ = counting_init
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        fm.FontProperties.__init__ = self.__init_function__
+        return False
+
+def reshape_uncached(text):
+    # how PersianText.reshape worked before the cache: a new ArabicReshaper for every label.
+    return get_display(ArabicReshaper(persiantext.__RESHAPER_CONFIG__).reshape(text))
+
+def use_reshape_cache(enabled):
+    """
+    Switches the reshape cache on or off. off is how the charts were drawn before the cache.
+    """
+    persiantext._reshape_cached = RESHAPE_CACHED if enabled else reshape_uncached
+    RESHAPE_CACHED.cache_clear()
+    return
+
+RESHAPE_CACHED = persiantext._reshape_cached
+
+def render(chart, data, chart_file, **kwargs):
+    with FontPropertiesCounter() as counter:
+        start = time.perf_counter()
+        chart(data, title='نمای آپارتمان‌های فروشی', chart_file=chart_file, **kwargs)
+        seconds = time.perf_counter() - start
+    plt.close('all')
+    return seconds, counter.count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=3, help='renders measured per chart; the median is reported')
+    parser.add_argument('--font', default=charts.__FONT__)
+    args = parser.parse_args()
+    charts.__FONT__ = args.font if os.path.exists(args.font) else os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf', 'DejaVuSans.ttf')
+
+    df_total, df_sell, df_rent = vectorized_prepare_datasets(synthetic_posts(args.rows), 'اصفهان')
+    jobs = [('overall', charts.overall_charts, df_total, {}),
+            ('sell', charts.sell_charts, df_sell, {'max_unit_price': 5e7}),
+            ('rent', charts.rent_charts, df_rent, {'max_unit_rent': 200000})]
+    print('** {} rows ({} sell, {} rent), font {}'.format(len(df_total), len(df_sell), len(df_rent), charts.__FONT__))
+    chart_file = os.path.join('/tmp' if os.path.isdir('/tmp') else '.', 'chart_benchmark.png')
+    for name, chart, data, kwargs in jobs:
+        # a first render warms up matplotlib and seaborn. runs with and without the cache are interleaved,
+        # so a drift of the process (e.g. a growing font cache) does not favour either of them.
+        render(chart, data, chart_file, **kwargs)
+        runs = {False: [], True: []}
+        for _ in range(args.repeat):
+            for enabled in (False, True):
+                use_reshape_cache(enabled)
+                if enabled:
+                    # the warm cache of a long-running renderer.
+                    render(chart, data, chart_file, **kwargs)
+                runs[enabled].append(render(chart, data, chart_file, **kwargs))
+        (old_seconds, old_count), (new_seconds, new_count) = [(statistics.median(seconds for seconds, _ in runs[enabled]), runs[enabled][-1][1])
+                                                              for enabled in (False, True)]
+        print('{:8s} no cache: {:6.2f} s   reshape cache: {:6.2f} s   saved {:7.1f} ms   {:5d} FontProperties'.format(
+              name, old_seconds, new_seconds, 1000 * (old_seconds - new_seconds), new_count))
+    use_reshape_cache(True)
@@ -0,0 +1,139 @@
+"""
+Throughput benchmark of the scrape -> parse -> store pipeline, run offline against benchmarks/server.py.
+
+    python benchmarks/crawl_benchmark.py [--corpus DIR] [--posts 1000] [--workers 1 8] [--rate R] [--latency 0.02]
+
+A synthetic corpus of benchmarks/fixtures.py is built in a temporary directory if --corpus is not given.
+For every number of workers, Divar.browse_and_save_items crawls all posts of the corpus, and the benchmark
+reports posts/second, p50/p95 latency of get_post_info, bytes transferred and peak RSS.
+Each crawl and prepare_datasets run in a new process while the stand-in server stays in this one, so peak RSS is
+the high-water mark of that run alone (including the imported modules), not of the server or of earlier runs.
+Listing collection over HTTP (Divar.get_posts_url), listing page parsing (Divar.parse_posts_href) and
+prepare_datasets on the crawled items are timed too.
+"""
+import os
+import sys
+import glob
+import time
+import resource
+import multiprocessing
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from divar import Divar
+import fixtures
+from server import CorpusServer
+
+class TimedDivar(Divar):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def get_post_info(self, *args, **kwargs):
+        start = time.perf_counter()
+        post_values = super().get_post_info(*args, **kwargs)
+        self.latencies.append(time.perf_counter() - start)
+        return post_values
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024
+
+def measured(function, *args):
+    return function(*args), peak_rss_mb()
+
+def run_in_process(function, *args):
+    """
+    Runs function(*args) in a new process. Returns (result, peak RSS of that process in MB).
+    ru_maxrss is a high-water mark of the whole process lifetime, so it is only meaningful per run in a fresh process.
+    """
+    with multiprocessing.get_context('spawn').Pool(processes=1) as pool:
+        return pool.apply(measured, (function,) + args)
+
+def crawl_items(base_url, urls_file_path, items_file_path, workers, rate, parser):
+    divar = TimedDivar(city='isfahan', category='real-estate', parser=parser, base_url=base_url)
+    start = time.perf_counter()
+    divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path,
+                                workers=workers, rate=rate, verbose=False)
+    return time.perf_counter() - start, divar.latencies
+
+def crawl(corpus_dir, work_dir, workers, rate, latency, parser):
+    with CorpusServer(corpus_dir, latency=latency) as server:
+        items_file_path = os.path.join(work_dir, 'items-{}.jsonl'.format(workers))
+        (elapsed, latencies), peak_rss = run_in_process(crawl_items, server.base_url, os.path.join(corpus_dir, 'posts.url'),
+                                                        items_file_path, workers, rate, parser)
+        print('workers {:3d}: {:8.1f} posts/s  p50 {:7.2f} ms  p95 {:7.2f} ms  {:8.2f} MB transferred  peak RSS {:7.1f} MB'.format(
+              workers, len(latencies) / elapsed, 1000 * percentile(latencies, 50), 1000 * percentile(latencies, 95),
+              server.bytes_sent / 1024 / 1024, peak_rss))
+    return items_file_path
+
+def collect_listing(corpus_dir, work_dir, latency):
+    with CorpusServer(corpus_dir, latency=latency) as server:
+        divar = Divar(city='isfahan', category='real-estate', base_url=server.base_url)
+        start = time.perf_counter()
+        posts_href = divar.get_posts_url(max_pages=100000, post_date_before=None, file_path=os.path.join(work_dir, 'listing.url'),
+                                         mode='http', rate=None, verbose=False)
+        elapsed = time.perf_counter() - start
+        print('listing collection: {:8.1f} pages/s  {} hrefs  {:8.2f} MB transferred'.format(
+              server.requests / elapsed, len(posts_href), server.bytes_sent / 1024 / 1024))
+    return
+
+def parse_listings(corpus_dir):
+    pages = []
+    for path in glob.glob(os.path.join(corpus_dir, 'listing', '*.html')):
+        with open(path, 'rb') as fp:
+            pages.append(fp.read())
+    if not pages:
+        return
+    start = time.perf_counter()
+    n_hrefs = sum(len(Divar.parse_posts_href(page)) for page in pages)
+    elapsed = time.perf_counter() - start
+    print('listing parse: {:8.2f} ms/page  {} hrefs in {} pages'.format(1000 * elapsed / len(pages), n_hrefs, len(pages)))
+    return
+
+def prepare_items(items_file_path):
+    from divar_realestate_charts import prepare_datasets
+    start = time.perf_counter()
+    df_total, df_sell, df_rent = prepare_datasets(items_file_path, city_name_fa='اصفهان')
+    return time.perf_counter() - start, len(df_total), len(df_sell), len(df_rent)
+
+def prepare(items_file_path):
+    try:
+        import divar_realestate_charts
+    except ImportError as e:
+        print('prepare_datasets: skipped,', e)
+        return
+    (elapsed, n_total, n_sell, n_rent), peak_rss = run_in_process(prepare_items, items_file_path)
+    print('prepare_datasets: {:8.1f} ms  {} rows ({} sell, {} rent)  peak RSS {:7.1f} MB'.format(
+          1000 * elapsed, n_total, n_sell, n_rent, peak_rss))
+    return
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', help='corpus directory of benchmarks/fixtures.py')
+    parser.add_argument('--posts', type=int, default=1000, help='number of posts of the synthetic corpus')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--rate', type=float, default=None, help='requests per second, no limit by default')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated server latency in seconds')
+    parser.add_argument('--parser', default=None, help='post_parser backend')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        corpus_dir = args.corpus
+        if corpus_dir is None:
+            corpus_dir = os.path.join(work_dir, 'corpus')
+            fixtures.build_corpus(corpus_dir, n_posts=args.posts)
+        items_file_path = None
+        for workers in args.workers:
+            items_file_path = crawl(corpus_dir, work_dir, workers, args.rate, args.latency, args.parser)
+        collect_listing(corpus_dir, work_dir, args.latency)
+        parse_listings(corpus_dir)
+        prepare(items_file_path)
@@ -0,0 +1,180 @@
+"""
+Synthetic divar.ir pages for offline benchmarks.
+The pages follow the markup read by post_parser (publish time span, div.section breadcrumbs and
+post-fields-item list) and Divar.parse_posts_href (div.browse-post-list of a.col-xs-12 cards), and
+are padded with a preloaded-state script to the size of real pages.
+
+A corpus directory has this layout, which benchmarks/server.py serves:
+    posts/{post_id}.html    post pages
+    listing/{page}.html     listing pages, 24 posts per page, newest first
+    posts.url               hrefs of all posts, like the .url files of get_posts_url
+    posts.jsonl             expected get_post_info values (without get_date)
+"""
+import os
+import sys
+import json
+import random
+
+LOCATIONS = ['سپاهان شهر', 'جلفا', 'مرداویج', 'چهارباغ بالا', 'آبشار', 'شیخ صدوق', 'هزار جریب', 'خانه اصفهان',
+             'ملک شهر', 'زینبیه', 'بهارستان', 'شاهین شهر', 'نظر شرقی', 'کوی امام', 'سعادت آباد']
+ROOMS = ['بدون اتاق', 'یک', 'دو', 'سه', 'چهار', 'پنج یا بیشتر']
+POST_DATES = ['لحظاتی پیش', 'دقایقی پیش', 'ربع ساعت پیش', 'نیم ساعت پیش', '۱ ساعت پیش', '۳ ساعت پیش',
+              'دیروز', '۲ روز پیش', '۴ روز پیش', 'هفتهٔ پیش', '۲ هفته پیش']
+SUB_CATEGORIES = ['آپارتمان', 'خانه و ویلا']
+
+def persian_digits(s):
+    return str(s).translate(str.maketrans('0123456789', '۰۱۲۳۴۵۶۷۸۹'))
+
+def persian_price(value):
+    return persian_digits('{:,}'.format(value).replace(',', '٫')) + ' تومان'
+
+def make_post(post_id, rng):
+    """
+    Returns the dict which get_post_info should return for a synthetic post, without get_date.
+    """
+    is_rent = rng.random() < 0.4
+    sub_category = rng.choice(SUB_CATEGORIES)
+    area = rng.randint(40, 600)
+    post = {'post_id': post_id,
+            'post_date': '{} در اصفهان، {}'.format(rng.choice(POST_DATES), rng.choice(LOCATIONS)),
+            'main_category': 'اجارهٔ مسکونی' if is_rent else 'فروش مسکونی',
+            'sub_category': sub_category,
+            'متراژ': persian_digits(area),
+            'محل': 'اصفهان، {}'.format(rng.choice(LOCATIONS)),
+            'دسته‌بندی': sub_category}
+    if rng.random() < 0.2:
+        post['سال ساخت'] = 'قبل از ۱۳۷۰'
+    else:
+        post['سال ساخت'] = persian_digits(rng.randint(1370, 1399))
+    post['تعداد اتاق'] = rng.choice(ROOMS)
+    if is_rent:
+        post['ودیعه'] = persian_price(rng.randint(1, 500) * 1000000)
+        post['اجاره'] = persian_price(rng.randint(0, 50) * 100000) if rng.random() < 0.8 else 'توافقی'
+    else:
+        unit_price = rng.randint(20, 300) * 100000
+        post['قیمت کل'] = persian_price(unit_price * area) if rng.random() < 0.95 else 'توافقی'
+        post['قیمت هر متر'] = persian_price(unit_price)
+    return post
+
+def make_post_page(post, rng, padding_kb=60):
+    fields = []
+    for name, value in post.items():
+        if name in ('post_id', 'post_date', 'main_category', 'sub_category'):
+            continue
+        if name == 'دسته‌بندی':
+            value_html = '<a class="post-fields-item__value" href="/s/isfahan/{0}">{1}</a>'.format(post['post_id'], value)
+        else:
+            value_html = '<div class="post-fields-item__value">{}</div>'.format(value)
+        fields.append('<div class="post-fields-item"><span class="post-fields-item__title">{}</span>{}</div>'.format(name, value_html))
+    state = {'post': post, 'widgets': [{'id': i, 'text': 'x' * 100, 'tags': ['a', 'b', 'c']} for i in range(padding_kb * 6)]}
+    nav = ''.join('<li class="nav__item"><a href="/s/isfahan/c{0}">دسته {0}</a></li>'.format(i) for i in range(40))
+    return '''<!DOCTYPE html>
+<html lang="fa" dir="rtl"><head><meta charset="utf-8"><title>{title} - دیوار</title>
+<script>window.__PRELOADED_STATE__ = {state};</script></head>
+<body><div id="app"><header class="header"><ul class="nav">{nav}</ul></header>
+<main class="post-page"><div class="post-header"><h1 class="post-header__title">{title}</h1>
+<span class="post-header__publish-time">{post_date}</span></div>
+<div class="breadcrumbs"><div class="section"><a href="/s/isfahan/real-estate">املاک</a></div><div class="section"><a href="/s/isfahan/c1">{main_category}</a></div><div class="section"><a href="/s/isfahan/c2">{sub_category}</a></div></div>
+<div class="post-fields">{fields}</div>
+<div class="post-description"><p>{title}</p></div></main>
+<footer class="footer"><ul class="nav">{nav}</ul></footer></div></body></html>
+'''.format(title='{} {} متری'.format(post['sub_category'], post['متراژ']), state=json.dumps(state), nav=nav,
+           post_date=post['post_date'], main_category=post['main_category'], sub_category=post['sub_category'],
+           fields=''.join(fields))
+
+def post_href(post_id):
+    return '/v/آپارتمان-اصفهان_آپارتمان_اصفهان_دیوار/{}'.format(post_id)
+
+def make_listing_page(posts, padding_kb=40):
+    cards = []
+    for post in posts:
+        cards.append('<a class="col-xs-12 col-sm-6 col-xl-4 p-tb-large p-lr-gutter post-card" href="{href}">'
+                     '<div class="post-card-item"><div class="kt-post-card__title">{title}</div>'
+                     '<div class="kt-post-card__description">{price}</div>'
+                     '<div class="kt-post-card__bottom-description">{post_date}</div></div></a>'.format(
+                     href=post_href(post['post_id']), title='{} {} متری'.format(post['sub_category'], post['متراژ']),
+                     price=post.get('قیمت کل', post.get('ودیعه', '')), post_date=post['post_date']))
+    state = {'widgets': [{'id': i, 'text': 'x' * 100} for i in range(padding_kb * 7)]}
+    return '''<!DOCTYPE html>
+<html lang="fa" dir="rtl"><head><meta charset="utf-8"><title>دیوار اصفهان</title>
+<script>window.__PRELOADED_STATE__ = {state};</script></head>
+<body><div id="app"><main class="browse"><div class="browse-post-list">{cards}</div></main></div></body></html>
+'''.format(state=json.dumps(state), cards=''.join(cards))
+
+def build_post_pages(directory, n_posts=100, seed=0):
+    """
+    Writes n_posts post pages as {post_id}.html and their expected values in posts.jsonl.
+    Returns list of expected post dicts.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    posts = []
+    with open(os.path.join(directory, 'posts.jsonl'), 'w') as fp:
+        for i in range(n_posts):
+            post = make_post('gX{:06d}'.format(i), rng)
+            with open(os.path.join(directory, '{}.html'.format(post['post_id'])), 'w') as page_fp:
+                page_fp.write(make_post_page(post, rng))
+            fp.write(json.dumps(post) + '\n')
+            posts.append(post)
+    return posts
+
+def build_corpus(directory, n_posts=1000, posts_per_page=24, seed=0):
+    """
+    Writes a synthetic corpus (see the layout at the top of this file). Returns list of expected post dicts.
+    """
+    posts = build_post_pages(os.path.join(directory, 'posts'), n_posts=n_posts, seed=seed)
+    os.replace(os.path.join(directory, 'posts', 'posts.jsonl'), os.path.join(directory, 'posts.jsonl'))
+    write_listing_pages(directory, posts, posts_per_page)
+    return posts
+
+def write_listing_pages(directory, posts, posts_per_page=24):
+    os.makedirs(os.path.join(directory, 'listing'), exist_ok=True)
+    for page, start in enumerate(range(0, len(posts), posts_per_page)):
+        with open(os.path.join(directory, 'listing', '{}.html'.format(page)), 'w') as fp:
+            fp.write(make_listing_page(posts[start:start + posts_per_page]))
+    with open(os.path.join(directory, 'posts.url'), 'w') as fp:
+        fp.write('\n'.join(post_href(post['post_id']) for post in posts))
+    return
+
+def record_corpus(urls_file_path, directory, max_posts=200):
+    """
+    Saves real post pages of a .url file of get_posts_url in a corpus directory, so benchmarks can
+    be run offline on recorded pages. Expected values are parsed with the bs4 backend.
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    import simple_request
+    import post_parser
+
+    os.makedirs(os.path.join(directory, 'posts'), exist_ok=True)
+    with open(urls_file_path, 'r') as fp:
+        hrefs = [line.strip() for line in fp if line.strip()][:max_posts]
+    posts = []
+    with open(os.path.join(directory, 'posts.jsonl'), 'w') as fp:
+        for href in hrefs:
+            post_id = href.split('/')[-1]
+            html = simple_request.simple_get('https://divar.ir{}'.format(href))
+            if html is None:
+                continue
+            with open(os.path.join(directory, 'posts', '{}.html'.format(post_id)), 'wb') as page_fp:
+                page_fp.write(html)
+            post = post_parser.parse_post_page(html, {'post_id': post_id}, backend=post_parser.get_backend('bs4'))
+            fp.write(json.dumps(post) + '\n')
+            posts.append(post)
+    # listing pages are rebuilt from the recorded posts, so the corpus does not depend on the live listing order.
+    # hrefs of the listing pages are synthetic, but server.py serves post pages by post_id only.
+    posts = [post for post in posts if 'post_date' in post and 'sub_category' in post and 'متراژ' in post]
+    write_listing_pages(directory, posts)
+    return posts
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='builds a synthetic corpus, or records one from divar.ir')
+    parser.add_argument('directory')
+    parser.add_argument('--posts', type=int, default=1000)
+    parser.add_argument('--record', metavar='URLS_FILE', help='record real post pages of a .url file instead')
+    args = parser.parse_args()
+    if args.record:
+        posts = record_corpus(args.record, args.directory, max_posts=args.posts)
+    else:
+        posts = build_corpus(args.directory, n_posts=args.posts)
+    print('** {} posts written to {}'.format(len(posts), args.directory))
@@ -0,0 +1,52 @@
+"""
+Compares the vectorized Jalali converters with the scalar Gregorian and Persian classes on a date column,
+and checks that both give the same dates.
+
+    python benchmarks/jalali_benchmark.py [--rows 1000000]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import jalali
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+def scalar_gregorian_to_persian(dates):
+    return np.array([jalali.Gregorian(d).persian_tuple() for d in dates]).T
+
+def scalar_persian_to_gregorian(dates):
+    return np.array([jalali.Persian(d).gregorian_tuple() for d in dates]).T
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    # get_date like column: a few years of crawl dates, many posts per day.
+    rng = np.random.default_rng(0)
+    days = np.datetime64('2018-01-01') + rng.integers(0, 5 * 365, args.rows)
+    gregorian_strings = np.datetime_as_string(days).astype(object)
+    print('** {} dates'.format(args.rows))
+
+    scalar, scalar_seconds = timed(scalar_gregorian_to_persian, gregorian_strings)
+    vectorized, vectorized_seconds = timed(jalali.gregorian_to_persian, gregorian_strings)
+    assert (np.stack(vectorized) == scalar).all()
+    _, datetime64_seconds = timed(jalali.gregorian_to_persian, days)
+    print('gregorian -> persian  scalar: {:7.3f} s  strings: {:7.3f} s x{:.0f}  datetime64: {:7.3f} s x{:.0f}'.format(
+          scalar_seconds, vectorized_seconds, scalar_seconds / vectorized_seconds,
+          datetime64_seconds, scalar_seconds / datetime64_seconds))
+
+    persian_strings = ['{}-{}-{}'.format(y, m, d) for y, m, d in scalar.T]
+    scalar, scalar_seconds = timed(scalar_persian_to_gregorian, persian_strings)
+    persian_ints = jalali.date_ints(*vectorized)
+    vectorized, vectorized_seconds = timed(jalali.persian_to_gregorian, persian_ints)
+    assert (np.stack(vectorized) == scalar).all()
+    print('persian -> gregorian  scalar: {:7.3f} s  YYYYMMDD ints: {:7.3f} s x{:.0f}'.format(
+          scalar_seconds, vectorized_seconds, scalar_seconds / vectorized_seconds))
@@ -0,0 +1,193 @@
+"""
+Compares the vectorized normalization of prepare_datasets with the original row-by-row implementation
+on a synthetic dataset, and checks that both give identical dataframes.
+
+    python benchmarks/normalize_benchmark.py [--rows 100000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import divar_realestate_charts as charts
+import fixtures
+
+def legacy_convert_persian_digits_to_latin(s):
+    digits = {'۰':'0', '۱':'1', '۲':'2', '۳':'3', '۴':'4', '۵':'5', '۶':'6', '۷':'7', '۸':'8', '۹':'9'}
+    if type(s) == str:
+        for pd in digits.keys():
+            s = s.replace(pd, digits[pd])
+    return s
+
+def legacy_prepare_datasets(df, city_name_fa):
+    """
+    prepare_datasets before vectorization, kept as the reference implementation.
+    """
+    filter_cols = ['post_id', 'get_date', 'post_date', 'main_category', 'sub_category',
+                'دسته‌بندی', 'محل', 'متراژ', 'سال ساخت', 'تعداد اتاق', 'ودیعه',
+                'اجاره', 'قیمت کل', 'قیمت هر متر']
+    df = df[filter_cols]
+    df.columns = ['post_id', 'get_date', 'post_date', 'main_category', 'sub_category',
+                'category', 'location', 'area', 'build_year', 'rooms', 'mortgage', 'rent',
+                'sell_price', 'sell_unit_price']
+
+    df['area'] = df['area'].apply(lambda x: legacy_convert_persian_digits_to_latin(x))
+    df['area'] = df['area'].apply(lambda x: x.replace(' متر', '') if type(x) == str else x)
+    df['area'] = df['area'].apply(lambda x: x.replace('٫', '') if type(x) == str else x)
+    df['area'] = df['area'].str.strip().astype('float')
+
+    df['build_year'] = df['build_year'].apply(lambda x: legacy_convert_persian_digits_to_latin(x))
+    df['build_year'] = df['build_year'].apply(lambda x: x.replace('قبل از ', '') if type(x) == str else x)
+    df['build_year'] = df['build_year'].str.strip().astype('float').astype('Int16')
+    df['age'] = charts.__BASE_YEAR__ - df['build_year']
+    df['age'] = df['age'].astype('float')
+
+    CNAME = city_name_fa + '، '
+    df['location'] = df['location'].apply(lambda x: x.replace(CNAME, '') if type(x) == str else x)
+
+    df['main_category'] = df['main_category'].fillna('')
+
+    df['ad_type'] = df['main_category'].apply(lambda x: charts.__RENT_STR__ if charts.__RENT_STR__ in x else charts.__SELL_STR__ if charts.__SELL_STR__ in x else charts.__OTHER_STR__)
+
+    rooms = {'بدون اتاق':'0',
+            'یک':'1',
+            'دو':'2',
+            'سه':'3',
+            'چهار':'4',
+            'پنج یا بیشتر':'5'}
+    for r in rooms.keys():
+        df['rooms'] = df['rooms'].apply(lambda x: x.replace(r, rooms[r]) if type(x) == str else x)
+    df['rooms'] = df['rooms'].str.strip().astype('float').astype('Int16')
+
+    df['sell_price'] = df['sell_price'].apply(lambda x: legacy_convert_persian_digits_to_latin(x))
+    df['sell_price'] = df['sell_price'].apply(lambda x: x.replace(' تومان', '') if type(x) == str else x)
+    df['sell_price'] = df['sell_price'].apply(lambda x: x.replace('٫', '') if type(x) == str else x)
+    df['sell_price'] = df['sell_price'].replace('توافقی', np.nan)
+    df['sell_price'] = df['sell_price'].replace('مجانی', np.nan)
+    df['sell_price'] = df['sell_price'].str.strip().astype('float')#.astype('Int64')
+
+    df['sell_unit_price'] = df['sell_unit_price'].apply(lambda x: legacy_convert_persian_digits_to_latin(x))
+    df['sell_unit_price'] = df['sell_unit_price'].apply(lambda x: x.replace(' تومان', '') if type(x) == str else x)
+    df['sell_unit_price'] = df['sell_unit_price'].apply(lambda x: x.replace('٫', '') if type(x) == str else x)
+    df['sell_unit_price'] = df['sell_unit_price'].replace('توافقی', np.nan)
+    df['sell_unit_price'] = df['sell_unit_price'].replace('مجانی', np.nan)
+    df['sell_unit_price'] = df['sell_unit_price'].str.strip().astype('float')#.astype('Int64')
+
+    df['mortgage'] = df['mortgage'].apply(lambda x: legacy_convert_persian_digits_to_latin(x))
+    df['mortgage'] = df['mortgage'].apply(lambda x: x.replace(' تومان', '') if type(x) == str else x)
+    df['mortgage'] = df['mortgage'].apply(lambda x: x.replace('٫', '') if type(x) == str else x)
+    df['mortgage'] = df['mortgage'].replace('توافقی', np.nan)
+    df['mortgage'] = df['mortgage'].replace('مجانی', np.nan)
+    df['mortgage'] = df['mortgage'].str.strip().astype('float')#.astype('Int64')
+
+    df['rent'] = df['rent'].apply(lambda x: legacy_convert_persian_digits_to_latin(x))
+    df['rent'] = df['rent'].apply(lambda x: x.replace(' تومان', '') if type(x) == str else x)
+    df['rent'] = df['rent'].apply(lambda x: x.replace('٫', '') if type(x) == str else x)
+    df['rent'] = df['rent'].replace('توافقی', np.nan)
+    df['rent'] = df['rent'].replace('مجانی', np.nan)
+    df['rent'] = df['rent'].str.strip().astype('float')#.astype('Int64')
+
+    area_cat_labels = (
+        'کمتر از ۱۰۰',
+        'از ۱۰۰ تا ۲۰۰',
+        'از ۲۰۰ تا ۳۰۰',
+        'از ۳۰۰ تا ۴۰۰',
+        'از ۴۰۰ تا ۵۰۰',
+        'بیشتر از ۵۰۰')
+    df['area_cat'] = pd.cut(df['area'], bins=(0, 100, 200, 300, 400, 500, np.inf), labels=area_cat_labels)
+
+    age_cat_labels = (
+        'کمتر از ۵',
+        'از ۵ تا ۱۰',
+        'از ۱۰ تا ۱۵',
+        'از ۱۵ تا ۲۰',
+        'از ۲۰ تا ۲۵',
+        'از ۲۵ تا ۳۰',
+        'بیشتر از ۳۰')
+    df['age_cat'] = pd.cut(df['age'], bins=(-1, 5, 10, 15, 20, 25, 30, np.inf), labels=age_cat_labels)
+
+    df2 = df[['location', 'sub_category', 'ad_type', 'age', 'rooms', 'area', 'sell_price', 'sell_unit_price', 'mortgage', 'rent', 'area_cat', 'age_cat']].copy()
+    df2 = df2[(~df2['sell_price'].isnull()) | (~df2['sell_unit_price'].isnull()) | (~df2['mortgage'].isnull()) | (~df2['rent'].isnull())]
+
+    # this is just for Isfahan
+    suburbs = ['شاهین شهر', 'بهارستان', 'فولادشهر', 'خمینی شهر', 'شهرضا', 'مبارکه', 'زرین‌شهر', 'تیران', 'گز', 'میمه']
+    for town in suburbs:
+        df2 = df2[df2['location'] != town]
+
+    df_sell = df2[df2['ad_type'] == charts.__SELL_STR__].copy()
+    del df_sell['mortgage']
+    del df_sell['rent']
+    df_sell = df_sell.dropna()
+
+    sell_unit_price_cat_labels = (
+        'کمتر از ۲ میلیون',
+        'از ۲ تا ۴ میلیون',
+        'از ۴ تا ۶ میلیون',
+        'از ۶ تا ۸ میلیون',
+        'از ۸ تا ۱۰ میلیون',
+        'بیشتر از ۱۰ میلیون')
+    df_sell['sell_unit_price_cat'] = pd.cut(df_sell['sell_unit_price'], bins=(0, 2000000, 4000000, 6000000, 8000000, 10000000, np.inf), labels=sell_unit_price_cat_labels)
+
+    df_rent = df2[df2['ad_type'] == charts.__RENT_STR__].copy()
+    del df_rent['sell_price']
+    del df_rent['sell_unit_price']
+    df_rent['rent'] = df_rent['rent'].fillna(0)
+    df_rent['mortgage'] = df_rent['mortgage'].fillna(0)
+    df_rent['rent_unit_price'] = (0.03 * df_rent['mortgage'] + df_rent['rent']) / df_rent['area']
+    df_rent['rent_unit_price'] = np.round(df_rent['rent_unit_price'])
+    df_rent = df_rent.dropna()
+
+    rent_unit_price_cat_labels = (
+        'کمتر از ۲۵ هزار',
+        'از ۲۵ تا ۵۰ هزار',
+        'از ۵۰ تا ۷۵ هزار',
+        'از ۷۵ تا ۱۰۰ هزار',
+        'از ۱۰۰ تا ۲۰۰ هزار',
+        'از ۲۰۰ تا ۳۰۰ هزار',
+        'بیشتر از ۳۰۰ هزار',
+    )
+    df_rent['rent_unit_price_cat'] = pd.cut(df_rent['rent_unit_price'], bins=(-1, 25000, 50000, 75000, 100000, 200000, 300000, np.inf), labels=rent_unit_price_cat_labels)
+    return df2, df_sell, df_rent
+
+def vectorized_prepare_datasets(df, city_name_fa):
+    df2 = charts.select_total(charts.normalize_posts(df, city_name_fa))
+    df_sell, df_rent = charts.split_sell_rent(df2)
+    return df2, df_sell, df_rent
+
+def synthetic_posts(n_rows, seed=0):
+    rng = random.Random(seed)
+    posts = []
+    for i in range(n_rows):
+        post = fixtures.make_post('gX{:06d}'.format(i), rng)
+        post['get_date'] = '2020-06-{:02d}'.format(rng.randint(1, 30))
+        # missing fields and fields without value, like real posts
+        if rng.random() < 0.05:
+            del post['تعداد اتاق']
+        if rng.random() < 0.02:
+            post['محل'] = None
+        posts.append(post)
+    return pd.DataFrame.from_records(posts)
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    df = synthetic_posts(args.rows)
+    print('** {} synthetic posts'.format(len(df)))
+    legacy, legacy_seconds = timed(legacy_prepare_datasets, df.copy(), 'اصفهان')
+    vectorized, vectorized_seconds = timed(vectorized_prepare_datasets, df.copy(), 'اصفهان')
+    for name, l, v in zip(('df_total', 'df_sell', 'df_rent'), legacy, vectorized):
+        pd.testing.assert_frame_equal(l, v)
+        print('{:10s} identical, {} rows'.format(name, len(v)))
+    print('legacy:     {:8.3f} s'.format(legacy_seconds))
+    print('vectorized: {:8.3f} s  x{:.1f}'.format(vectorized_seconds, legacy_seconds / vectorized_seconds))
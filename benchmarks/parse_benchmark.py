@@ -0,0 +1,57 @@
+"""
+Compares per-page parse time of post_parser backends on saved post pages.
+
+    python benchmarks/parse_benchmark.py [PAGES_DIR] [--repeat N]
+
+PAGES_DIR holds saved post pages (*.html). synthetic pages of benchmarks/fixtures.py are used if it is not given.
+Every backend must return exactly the same values as the bs4 backend.
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import post_parser
+import fixtures
+
+def benchmark(pages, repeat):
+    expected = [post_parser.parse_post_page(html, {}, backend=post_parser.get_backend('bs4')) for html in pages]
+    results = {}
+    for name in post_parser.PARSER_BACKENDS:
+        backend = post_parser.get_backend(name)
+        parsed = [post_parser.parse_post_page(html, {}, backend=backend) for html in pages]
+        mismatches = sum(1 for p, e in zip(parsed, expected) if p != e)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for html in pages:
+                post_parser.parse_post_page(html, {}, backend=backend)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = (1000 * best / len(pages), mismatches)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pages_dir', nargs='?')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pages_dir = args.pages_dir
+        if pages_dir is None:
+            pages_dir = tmp_dir
+            fixtures.build_post_pages(pages_dir)
+        pages = []
+        for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+            with open(path, 'rb') as fp:
+                pages.append(fp.read())
+        print('** {} pages, {:.1f} KB per page'.format(len(pages), sum(len(p) for p in pages) / len(pages) / 1024))
+
+        results = benchmark(pages, args.repeat)
+        base = results['bs4'][0]
+        for name, (ms, mismatches) in sorted(results.items(), key=lambda r: r[1][0]):
+            print('{:12s} {:8.3f} ms/page  x{:5.1f}  mismatches: {}'.format(name, ms, base / ms, mismatches))
@@ -0,0 +1,128 @@
+"""
+Local HTTP stand-in for divar.ir which serves a corpus directory of benchmarks/fixtures.py.
+
+    /v/.../{post_id}             posts/{post_id}.html
+    /s/{city}/{category}?page=N  listing/{N-1}.html (page 1 if page is not given)
+
+    python benchmarks/server.py CORPUS_DIR [--port 8000] [--latency 0.05]
+"""
+import os
+import gzip
+import time
+import threading
+from urllib.parse import urlsplit, unquote, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class CorpusRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately; without this, delayed ACKs add ~40 ms to every response.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server.corpus_server
+        if server.latency:
+            time.sleep(server.latency)
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        if path.startswith('/v/'):
+            file_path = os.path.join(server.corpus_dir, 'posts', '{}.html'.format(path.rstrip('/').split('/')[-1]))
+        elif path.startswith('/s/'):
+            page = parse_qs(url.query).get('page', ['1'])[0]
+            file_path = os.path.join(server.corpus_dir, 'listing', '{}.html'.format(int(page) - 1 if page.isdigit() else -1))
+        else:
+            file_path = None
+
+        body = server.read(file_path, 'gzip' in self.headers.get('Accept-Encoding', '')) if file_path else None
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            server.count(0)
+            return
+        content, encoding = body
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        server.count(len(content))
+        return
+
+    def log_message(self, format, *args):
+        return
+
+class CorpusServer:
+    """
+    Runs the stand-in server in a background thread and counts requests and bytes sent.
+    latency: seconds to wait before answering each request, to simulate the round-trip to divar.ir.
+    """
+    def __init__(self, corpus_dir, host='127.0.0.1', port=0, latency=0.0):
+        self.corpus_dir = corpus_dir
+        self.latency = latency
+        self.requests = 0
+        self.bytes_sent = 0
+        self.__lock__ = threading.Lock()
+        self.__cache__ = {}
+        self.__httpd__ = ThreadingHTTPServer((host, port), CorpusRequestHandler)
+        self.__httpd__.daemon_threads = True
+        self.__httpd__.corpus_server = self
+        self.__thread__ = None
+
+    @property
+    def base_url(self):
+        host, port = self.__httpd__.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def read(self, file_path, compress):
+        key = (file_path, compress)
+        if key not in self.__cache__:
+            if not os.path.exists(file_path):
+                return None
+            with open(file_path, 'rb') as fp:
+                content = fp.read()
+            self.__cache__[key] = (gzip.compress(content), 'gzip') if compress else (content, None)
+        return self.__cache__[key]
+
+    def count(self, n_bytes):
+        with self.__lock__:
+            self.requests += 1
+            self.bytes_sent += n_bytes
+        return
+
+    def start(self):
+        self.__thread__ = threading.Thread(target=self.__httpd__.serve_forever, daemon=True)
+        self.__thread__.start()
+        return self
+
+    def serve_forever(self):
+        self.__httpd__.serve_forever()
+        return
+
+    def stop(self):
+        self.__httpd__.shutdown()
+        self.__httpd__.server_close()
+        return
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('corpus_dir')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+    server = CorpusServer(args.corpus_dir, port=args.port, latency=args.latency)
+    print('** serving {} on {}'.format(args.corpus_dir, server.base_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
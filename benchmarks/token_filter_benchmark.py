@@ -0,0 +1,74 @@
+"""
+Filtering throughput of persiantext.TokenFilter against the original multi-pass PersianText.filter_tokens,
+on synthetic ad descriptions, and checks that both keep the same tokens.
+
+    python benchmarks/token_filter_benchmark.py [--documents 20000] [--processes 1 4]
+
+Documents are given as token lists, so the nltk tokenizer (and its data files) is not part of the measurement.
+POS tagging is not used, since it needs the hazm model file.
+"""
+import os
+import sys
+import re
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import persiantext
+import fixtures
+
+def legacy_filter_tokens(all_tokens, stop_words=None, include_words=None, min_len=1, max_len=100, language=None):
+    # filter_tokens before TokenFilter, without POS tagging and reshaping.
+    filtered_tokens = [t for t in all_tokens if len(t) >= min_len and len(t) <= max_len]
+    if include_words is not None:
+        all_include_words = set([w for words in include_words for w in words])
+        filtered_tokens = [t for t in filtered_tokens if t in all_include_words]
+    if stop_words is not None:
+        all_stop_words = set([w for words in stop_words for w in words])
+        filtered_tokens = [t for t in filtered_tokens if t not in all_stop_words]
+    if language is not None:
+        if language.lower() == 'fa':
+            filtered_tokens = [t for t in filtered_tokens if re.search('[a-zA-Z]', t) is None]
+        elif language.lower() == 'en':
+            filtered_tokens = [t for t in filtered_tokens if re.search('[a-zA-Z]', t) is not None]
+    return filtered_tokens
+
+STOP_WORDS = [['و', 'در', 'به', 'از', 'که', 'با', 'این', 'را', 'است', 'برای'], ['ها', 'می', 'های']]
+WORDS = ['آپارتمان', 'خانه', 'فروش', 'اجاره', 'پارکینگ', 'آسانسور', 'انباری', 'نوساز', 'متری', 'طبقه', 'واحد', 'کابینت',
+         'ویلا', 'شمالی', 'جنوبی', 'سند', 'تک', 'برگ', 'فوری', 'معاوضه', 'parking', 'lobby', 'VIP', '۱۲۰', 'م']
+
+def synthetic_documents(n_documents, seed=0):
+    rng = random.Random(seed)
+    words = WORDS + fixtures.LOCATIONS + [w for words in STOP_WORDS for w in words]
+    return [[rng.choice(words) for _ in range(rng.randint(20, 80))] for _ in range(n_documents)]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', type=int, default=20000)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+
+    documents = synthetic_documents(args.documents)
+    n_tokens = sum(len(tokens) for tokens in documents)
+    options = {'stop_words': STOP_WORDS, 'min_len': 2, 'language': 'fa'}
+    print('** {} documents, {} tokens'.format(len(documents), n_tokens))
+
+    start = time.perf_counter()
+    legacy = [legacy_filter_tokens(tokens, **options) for tokens in documents]
+    legacy_seconds = time.perf_counter() - start
+    print('legacy filter_tokens:       {:10.0f} tokens/s'.format(n_tokens / legacy_seconds))
+
+    start = time.perf_counter()
+    token_filter = persiantext.TokenFilter(**options)
+    filtered = token_filter.filter_many(documents)
+    seconds = time.perf_counter() - start
+    assert filtered == legacy
+    print('TokenFilter:                {:10.0f} tokens/s  x{:.1f}'.format(n_tokens / seconds, legacy_seconds / seconds))
+
+    for processes in args.processes:
+        start = time.perf_counter()
+        filtered = persiantext.filter_many(documents, token_filter, processes=processes)
+        seconds = time.perf_counter() - start
+        assert filtered == legacy
+        print('filter_many, {:2d} processes: {:10.0f} tokens/s  x{:.1f}'.format(processes, n_tokens / seconds, legacy_seconds / seconds))
@@ -0,0 +1,189 @@
+"""
+Renders the charts of divar_realestate_charts.py in parallel processes.
+
+    python chart_renderer.py --cities isfahan mashhad --processes 4 [--date 13990330]
+
+For each city, the datasets of ./data/{city}--real-estate--{jalali date}.jsonl (or .json) are prepared once,
+and the overall, apartment-sell, apartment-rent, house-sell and house-rent charts of every city are rendered
+by a process pool with the Agg backend. The render time of each chart is printed.
+
+    python chart_renderer.py --cities isfahan --db ./data/listings.sqlite [--date 13990330]
+
+draws the charts of a snapshot of a listing_db file instead, from aggregates computed by SQLite.
+"""
+import os
+import time
+import multiprocessing
+from datetime import datetime
+import matplotlib.pyplot as plt
+import divar_realestate_charts as charts
+import listing_db
+import jalali
+
+# sub_category -> (English name, Persian name)
+SUB_CATEGORIES = {'آپارتمان': ('apartment', 'آپارتمان‌های'), 'خانه و ویلا': ('house', 'خانه‌های')}
+MAX_UNIT_PRICE = 5e7
+MAX_UNIT_RENT = 200000
+
+class ChartJob:
+    def __init__(self, name, chart, data, title, chart_file, **kwargs):
+        """
+        chart: 'overall', 'sell' or 'rent'.
+        kwargs: other arguments of the chart function, e.g. max_unit_price.
+        """
+        self.name = name
+        self.chart = chart
+        self.data = data
+        self.title = title
+        self.chart_file = chart_file
+        self.kwargs = kwargs
+
+CHART_FUNCTIONS = {'overall': charts.overall_charts, 'sell': charts.sell_charts, 'rent': charts.rent_charts}
+
+def city_chart_jobs(city_name_en, jd, datasets, charts_dir='./charts'):
+    """
+    Returns the jobs of the five charts of a city. datasets: (df_total, df_sell, df_rent) of prepare_datasets.
+    """
+    df_total, df_sell, df_rent = datasets
+    jobs = [ChartJob('{}--overall'.format(city_name_en), 'overall', df_total,
+                     'نمای کلی آگهی‌های املاک {}'.format(charts.CITY_NAMES[city_name_en]),
+                     os.path.join(charts_dir, '{}--overall-{}.png'.format(city_name_en, jd)))]
+    for sub_category, (sub_category_en, sub_category_fa) in SUB_CATEGORIES.items():
+        name = '{}--{}-sell'.format(city_name_en, sub_category_en)
+        jobs.append(ChartJob(name, 'sell', df_sell[df_sell['sub_category'] == sub_category],
+                             'نمای {} فروشی'.format(sub_category_fa),
+                             os.path.join(charts_dir, '{}--{}.png'.format(name, jd)), max_unit_price=MAX_UNIT_PRICE))
+        name = '{}--{}-rent'.format(city_name_en, sub_category_en)
+        jobs.append(ChartJob(name, 'rent', df_rent[df_rent['sub_category'] == sub_category],
+                             'نمای {} اجاره‌ای'.format(sub_category_fa),
+                             os.path.join(charts_dir, '{}--{}.png'.format(name, jd)), max_unit_rent=MAX_UNIT_RENT))
+    return jobs
+
+def db_chart_jobs(db, city_name_en, jd, charts_dir='./charts', **selection):
+    """
+    Returns the jobs of the five charts of a city, with cubes of a listing_db.ListingDB instead of datasets.
+    selection: snapshots, start and end of the rows, e.g. start='13990301', end='13990331' for charts of a month.
+    """
+    jobs = [ChartJob('{}--overall'.format(city_name_en), 'overall', None,
+                     'نمای کلی آگهی‌های املاک {}'.format(charts.CITY_NAMES[city_name_en]),
+                     os.path.join(charts_dir, '{}--overall-{}.png'.format(city_name_en, jd)),
+                     cube=db.chart_cube('total', cities=[city_name_en], **selection))]
+    for sub_category, (sub_category_en, sub_category_fa) in SUB_CATEGORIES.items():
+        where = {'sub_category': sub_category}
+        name = '{}--{}-sell'.format(city_name_en, sub_category_en)
+        jobs.append(ChartJob(name, 'sell', None, 'نمای {} فروشی'.format(sub_category_fa),
+                             os.path.join(charts_dir, '{}--{}.png'.format(name, jd)),
+                             cube=db.chart_cube('sell', 'sell_unit_price', MAX_UNIT_PRICE, cities=[city_name_en], where=where, **selection)))
+        name = '{}--{}-rent'.format(city_name_en, sub_category_en)
+        jobs.append(ChartJob(name, 'rent', None, 'نمای {} اجاره‌ای'.format(sub_category_fa),
+                             os.path.join(charts_dir, '{}--{}.png'.format(name, jd)),
+                             cube=db.chart_cube('rent', 'rent_unit_price', MAX_UNIT_RENT, cities=[city_name_en], where=where, **selection)))
+    return jobs
+
+def use_agg_backend():
+    plt.switch_backend('Agg')
+    return
+
+def render_chart(job):
+    """
+    Renders one chart. Returns (job name, seconds, error).
+    """
+    start = time.time()
+    try:
+        CHART_FUNCTIONS[job.chart](job.data, title=job.title, chart_file=job.chart_file, **job.kwargs)
+    except Exception as e:
+        return job.name, time.time() - start, repr(e)
+    finally:
+        # figures are 20x35 inches; a worker renders many of them.
+        plt.close('all')
+    return job.name, time.time() - start, None
+
+def render_charts(jobs, processes=4):
+    """
+    Renders jobs in at most `processes` processes, or in this process if processes is 1.
+    Returns list of (job name, seconds, error), in the order jobs finish.
+    """
+    processes = max(1, min(processes, len(jobs)))
+    results = []
+    if processes == 1:
+        use_agg_backend()
+        for job in jobs:
+            results.append(render_chart(job))
+            print_result(*results[-1])
+        return results
+    with multiprocessing.Pool(processes=processes, initializer=use_agg_backend) as pool:
+        for result in pool.imap_unordered(render_chart, jobs):
+            results.append(result)
+            print_result(*result)
+    return results
+
+def print_result(name, seconds, error):
+    status = 'ERROR: {}'.format(error) if error else 'done'
+    print('** {}: {:.1f} s, {}'.format(name, seconds, status))
+    return
+
+def render_city_charts(cities, jd=None, processes=4, data_dir='./data', charts_dir='./charts', cache_dir='./data/cache'):
+    """
+    Prepares the datasets of each city and renders the charts of all cities in one process pool.
+    jd: jalali date of the items files, today by default.
+    """
+    if jd is None:
+        jd = jalali.Gregorian(str(datetime.now().date())).persian_string(date_format='{}{:02d}{:02d}')
+    os.makedirs(charts_dir, exist_ok=True)
+    jobs = []
+    for city_name_en in cities:
+        raw_data = os.path.join(data_dir, '{}--real-estate--{}.jsonl'.format(city_name_en, jd))
+        if not os.path.exists(raw_data):
+            raw_data = raw_data[:-1]
+        if not os.path.exists(raw_data):
+            print('***** ERROR:', raw_data, 'NOT FOUND!')
+            continue
+        print('** Preparing data of {} ...'.format(city_name_en))
+        datasets = charts.prepare_datasets(raw_data, city_name_fa=charts.CITY_NAMES[city_name_en], cache_dir=cache_dir)
+        jobs.extend(city_chart_jobs(city_name_en, jd, datasets, charts_dir))
+    if not jobs:
+        return []
+
+    print('** Visualizing data ...')
+    start = time.time()
+    results = render_charts(jobs, processes=processes)
+    print('*** {} charts in {:.1f} s'.format(len(results), time.time() - start))
+    return results
+
+def render_db_charts(db_file, cities, jd=None, processes=4, charts_dir='./charts', **selection):
+    """
+    Renders the charts of each city from a listing_db.ListingDB file, of the snapshot jd (the latest one by default)
+    or of the rows of selection (see db_chart_jobs). Only the cubes of the charts are read from the database.
+    """
+    os.makedirs(charts_dir, exist_ok=True)
+    jobs = []
+    with listing_db.ListingDB(db_file) as db:
+        for city_name_en in cities:
+            snapshots = db.snapshots(city_name_en)
+            if not snapshots:
+                print('***** ERROR: no snapshot of', city_name_en, 'in', db_file)
+                continue
+            city_selection = selection if selection else {'snapshots': [jd or snapshots[-1]]}
+            jobs.extend(db_chart_jobs(db, city_name_en, jd or snapshots[-1], charts_dir, **city_selection))
+    if not jobs:
+        return []
+
+    print('** Visualizing data ...')
+    start = time.time()
+    results = render_charts(jobs, processes=processes)
+    print('*** {} charts in {:.1f} s'.format(len(results), time.time() - start))
+    return results
+
+# --------------------------------------------------------------------------
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cities', nargs='+', default=['isfahan'])
+    parser.add_argument('--date', default=None, help='jalali date of the items files, e.g. 13990330. today by default')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--db', default=None, help='a listing_db file to draw the charts from, instead of the items files')
+    args = parser.parse_args()
+    if args.db:
+        render_db_charts(args.db, args.cities, jd=args.date, processes=args.processes)
+    else:
+        render_city_charts(args.cities, jd=args.date, processes=args.processes)
@@ -0,0 +1,253 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+
+__DONE__ = 'done'
+__FAILED__ = 'failed'
+
+class CrawlJournal:
+    """
+    Append-only log of crawled posts. Each line is: status, post_id and time, separated by tabs.
+    status is 'done' for saved posts and 'failed' for posts which could not be fetched.
+    The log is read once when the journal is opened, so a restarted crawl knows which posts are finished
+    and how many times each failed post has been tried.
+    """
+    def __init__(self, file_path, max_attempts=3):
+        """
+        max_attempts: a failed post is retried in later runs until it has failed max_attempts times.
+        """
+        self.__file_path__ = file_path
+        self.__max_attempts__ = max_attempts
+        self.__done__ = set()
+        self.__failures__ = {}
+        self.__fp__ = None
+
+    def open(self):
+        if os.path.exists(self.__file_path__):
+            with open(self.__file_path__, 'r') as fp:
+                for line in fp:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) < 2:
+                        continue
+                    self._update(fields[0], fields[1])
+        self.__fp__ = open(self.__file_path__, 'a')
+        return self
+
+    def _update(self, status, post_id):
+        if status == __DONE__:
+            self.__done__.add(post_id)
+            self.__failures__.pop(post_id, None)
+        elif status == __FAILED__:
+            self.__failures__[post_id] = self.__failures__.get(post_id, 0) + 1
+        return
+
+    def _write(self, status, post_id):
+        self._update(status, post_id)
+        self.__fp__.write('{}\t{}\t{}\n'.format(status, post_id, datetime.now().isoformat(timespec='seconds')))
+        self.__fp__.flush()
+        return
+
+    def mark_done(self, post_id):
+        self._write(__DONE__, post_id)
+        return
+
+    def mark_failed(self, post_id):
+        self._write(__FAILED__, post_id)
+        return
+
+    def is_done(self, post_id):
+        return post_id in self.__done__
+
+    def attempts(self, post_id):
+        return self.__failures__.get(post_id, 0)
+
+    def should_fetch(self, post_id):
+        """
+        Returns False for finished posts and for posts that failed max_attempts times.
+        """
+        if post_id in self.__done__:
+            return False
+        return self.attempts(post_id) < self.__max_attempts__
+
+    def failed_posts(self):
+        return dict(self.__failures__)
+
+    def close(self):
+        if self.__fp__ is not None:
+            self.__fp__.close()
+            self.__fp__ = None
+        return
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def post_id_of(post_url):
+    return post_url.replace('\n', '').split('/')[-1]
+
+class ListingWatermark:
+    """
+    High-water mark of the listing of a (city, category): ids of the most recently collected posts, newest first,
+    saved as JSON. Listing pages are sorted newest first, so an incremental collection can stop at the first page
+    whose posts are mostly known. A page is not stopped at for a single known post, because bumped posts
+    come back to the top of the listing.
+    """
+    def __init__(self, file_path, max_ids=5000, stop_ratio=0.5):
+        """
+        max_ids: number of post ids kept in the file.
+        stop_ratio: collection stops at a page when at least this ratio of its posts are known.
+        """
+        self.__file_path__ = file_path
+        self.__max_ids__ = max_ids
+        self.__stop_ratio__ = stop_ratio
+        self.__post_ids__ = []
+        self.__known__ = set()
+        self.__updated__ = None
+        if os.path.exists(file_path):
+            with open(file_path, 'r') as fp:
+                state = json.load(fp)
+            self.__post_ids__ = state.get('post_ids', [])
+            self.__known__ = set(self.__post_ids__)
+            self.__updated__ = state.get('updated')
+
+    def last_updated(self):
+        return self.__updated__
+
+    def __len__(self):
+        return len(self.__post_ids__)
+
+    def is_known(self, post_id):
+        return post_id in self.__known__
+
+    def reached(self, post_ids):
+        """
+        Returns True if the page with post_ids is in the known part of the listing.
+        """
+        if not post_ids or not self.__known__:
+            return False
+        known = sum(1 for post_id in post_ids if post_id in self.__known__)
+        return known >= self.__stop_ratio__ * len(post_ids)
+
+    def update(self, new_post_ids):
+        """
+        Puts new_post_ids (newest first) on top of the mark and saves it.
+        """
+        new_post_ids = [post_id for post_id in new_post_ids if post_id not in self.__known__]
+        self.__post_ids__ = (new_post_ids + self.__post_ids__)[:self.__max_ids__]
+        self.__known__ = set(self.__post_ids__)
+        self.__updated__ = datetime.now().isoformat(timespec='seconds')
+        tmp_file_path = self.__file_path__ + '.tmp'
+        with open(tmp_file_path, 'w') as fp:
+            json.dump({'post_ids': self.__post_ids__, 'updated': self.__updated__}, fp)
+        os.replace(tmp_file_path, self.__file_path__)
+        return
+
+# post-fields-item values which make the content fingerprint of a post.
+FINGERPRINT_FIELDS = ('محل', 'متراژ', 'قیمت کل', 'ودیعه', 'اجاره', 'تعداد اتاق')
+__FINGERPRINT_TABLE__ = str.maketrans('۰۱۲۳۴۵۶۷۸۹', '0123456789', '٫, ')
+
+def post_fingerprint(post_values):
+    """
+    Returns fingerprint of the location, area, price and rooms of a post (a dict of get_post_info), or None if it has
+    none of them. A reposted or bumped ad has a new post_id but the same fingerprint.
+    """
+    return fingerprint_of_values([post_values.get(field) for field in FINGERPRINT_FIELDS])
+
+def fingerprint_of_values(values):
+    """
+    values: values of FINGERPRINT_FIELDS, in their order. missing values are None (or NaN).
+    """
+    values = [v.translate(__FINGERPRINT_TABLE__) if isinstance(v, str) else '' for v in values]
+    if not any(values):
+        return None
+    return hashlib.sha1('\x1f'.join(values).encode('utf-8')).hexdigest()[:16]
+
+class DedupIndex:
+    """
+    Index of posts seen in crawl snapshots, by post_id and by content fingerprint (see post_fingerprint).
+    Each line of the append-only file is: post_id, fingerprint and source (e.g. the snapshot), separated by tabs.
+    The file is read once when the index is opened; lookups are dict lookups.
+    file_path None keeps the index in memory only.
+    """
+    def __init__(self, file_path=None):
+        self.__file_path__ = file_path
+        # post_id -> (fingerprint, source of its first sighting)
+        self.__posts__ = {}
+        # fingerprint -> post_id of its first sighting
+        self.__fingerprints__ = {}
+        self.__fp__ = None
+
+    def open(self):
+        if self.__file_path__ is None:
+            return self
+        if os.path.exists(self.__file_path__):
+            with open(self.__file_path__, 'r') as fp:
+                for line in fp:
+                    fields = line.rstrip('\n').split('\t')
+                    if len(fields) < 3:
+                        continue
+                    self._update(fields[0], fields[1] or None, fields[2])
+        self.__fp__ = open(self.__file_path__, 'a')
+        return self
+
+    def _update(self, post_id, fingerprint, source):
+        if post_id not in self.__posts__:
+            self.__posts__[post_id] = (fingerprint, source)
+        if fingerprint is not None and fingerprint not in self.__fingerprints__:
+            self.__fingerprints__[fingerprint] = post_id
+        return
+
+    def __len__(self):
+        return len(self.__posts__)
+
+    def is_known(self, post_id):
+        return post_id in self.__posts__
+
+    def is_known_fingerprint(self, fingerprint):
+        return fingerprint in self.__fingerprints__
+
+    def source_of(self, post_id):
+        entry = self.__posts__.get(post_id)
+        return entry[1] if entry else None
+
+    def duplicate_of(self, post_id, fingerprint, source=None):
+        """
+        Returns post_id of the first sighting of a post, if this one is a copy of it, otherwise None.
+        A post is a copy if its post_id was seen in another source, or its fingerprint was seen with another post_id.
+        """
+        entry = self.__posts__.get(post_id)
+        if entry is not None and entry[1] != source:
+            return post_id
+        original = self.__fingerprints__.get(fingerprint) if fingerprint is not None else None
+        if original is not None and original != post_id:
+            return original
+        return None
+
+    def add(self, post_id, fingerprint, source=''):
+        """
+        Adds a sighting of a post. Only new post_ids and new fingerprints are written to the file.
+        """
+        if post_id in self.__posts__ and (fingerprint is None or fingerprint in self.__fingerprints__):
+            return
+        self._update(post_id, fingerprint, source)
+        if self.__fp__ is not None:
+            self.__fp__.write('{}\t{}\t{}\n'.format(post_id, fingerprint or '', source))
+            self.__fp__.flush()
+        return
+
+    def close(self):
+        if self.__fp__ is not None:
+            self.__fp__.close()
+            self.__fp__ = None
+        return
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,155 @@
+import os
+import json
+import hashlib
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# change it whenever the output of prepare_datasets changes, so old cache files are not used.
+CACHE_VERSION = 1
+
+CATEGORICAL_COLUMNS = ('location', 'sub_category', 'area_cat', 'age_cat')
+DATASET_NAMES = ('total', 'sell', 'rent')
+
+def available():
+    return pyarrow is not None
+
+def to_categorical(df, columns=CATEGORICAL_COLUMNS):
+    """
+    Converts text columns to categorical dtype. columns which are already categorical (e.g. pd.cut results) are kept.
+    """
+    for col in columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+# pandas nullable integer types of ParquetStore columns. Parquet keeps them as plain integers with nulls,
+# which are read back as float64 without the pandas metadata.
+NULLABLE_INTEGER_TYPES = ('Int8', 'Int16', 'Int32', 'Int64')
+
+def restore_types(df, column_types):
+    """
+    Converts columns of a file of ParquetStore back to the pandas nullable integer types of column_types.
+    """
+    for col, type_name in column_types.items():
+        if type_name in NULLABLE_INTEGER_TYPES and col in df.columns:
+            df[col] = df[col].astype(type_name)
+    return df
+
+class DatasetCache:
+    """
+    Parquet files of the datasets of prepare_datasets, keyed on the SHA-1 of the raw file.
+    The hash of each raw file is kept with its mtime and size in a manifest, so an unchanged
+    raw file is not hashed again.
+    """
+    def __init__(self, cache_dir='./data/cache'):
+        self.__cache_dir__ = cache_dir
+        self.__manifest_path__ = os.path.join(cache_dir, 'manifest.json')
+
+    def _read_manifest(self):
+        if not os.path.exists(self.__manifest_path__):
+            return {}
+        with open(self.__manifest_path__, 'r') as fp:
+            return json.load(fp)
+
+    def _write_manifest(self, manifest):
+        tmp_path = self.__manifest_path__ + '.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump(manifest, fp)
+        os.replace(tmp_path, self.__manifest_path__)
+        return
+
+    def file_hash(self, raw_file):
+        stat = os.stat(raw_file)
+        manifest = self._read_manifest()
+        entry = manifest.get(os.path.abspath(raw_file))
+        if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            return entry['sha1']
+        sha1 = hashlib.sha1()
+        with open(raw_file, 'rb') as fp:
+            for block in iter(lambda: fp.read(1 << 20), b''):
+                sha1.update(block)
+        os.makedirs(self.__cache_dir__, exist_ok=True)
+        manifest[os.path.abspath(raw_file)] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha1': sha1.hexdigest()}
+        self._write_manifest(manifest)
+        return sha1.hexdigest()
+
+    def _paths(self, raw_file, key):
+        key = hashlib.sha1('{}--{}--{}'.format(self.file_hash(raw_file), key, CACHE_VERSION).encode('utf-8')).hexdigest()[:16]
+        base_name = os.path.splitext(os.path.basename(raw_file))[0]
+        return [os.path.join(self.__cache_dir__, '{}--{}--{}.parquet'.format(base_name, key, name)) for name in DATASET_NAMES]
+
+    def load(self, raw_file, key=''):
+        """
+        Returns cached (df_total, df_sell, df_rent) of raw_file, or None if they are not cached.
+        key: other inputs of the datasets, e.g. the city name.
+        """
+        paths = self._paths(raw_file, key)
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        return tuple(pd.read_parquet(path) for path in paths)
+
+    def save(self, raw_file, datasets, key=''):
+        os.makedirs(self.__cache_dir__, exist_ok=True)
+        for df, path in zip(datasets, self._paths(raw_file, key)):
+            tmp_path = path + '.tmp'
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+        return
+
+class ParquetStore:
+    """
+    Appends dataframes to a Parquet file, one row group per append, so a dataset can be written chunk by chunk.
+    column_types: {column: type name} of the file, e.g. {'location': 'string', 'rooms': 'Int16', 'area': 'float64'}.
+    nullable integer types (e.g. 'Int16') are stored as integers with nulls, see restore_types.
+    A fixed schema keeps chunks consistent, even if a column of a chunk has no values at all.
+    Categorical columns are stored as their values.
+    """
+    def __init__(self, file_path, column_types):
+        if pyarrow is None:
+            raise ImportError('pyarrow is needed to write Parquet files')
+        self.__file_path__ = file_path
+        self.__schema__ = pyarrow.schema([(col, pyarrow.type_for_alias(type_name.lower())) for col, type_name in column_types.items()])
+        self.__writer__ = None
+        self.rows = 0
+
+    def open(self):
+        directory = os.path.dirname(self.__file_path__)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.__writer__ = pyarrow.parquet.ParquetWriter(self.__file_path__ + '.tmp', self.__schema__)
+        return self
+
+    def append(self, df):
+        df = df[self.__schema__.names].copy()
+        for col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype(object)
+        table = pyarrow.Table.from_pandas(df, schema=self.__schema__, preserve_index=False)
+        self.__writer__.write_table(table)
+        self.rows += len(df)
+        return
+
+    def close(self, commit=True):
+        """
+        The file is moved to file_path only when all chunks are written, so readers never see a partial file.
+        """
+        if self.__writer__ is not None:
+            self.__writer__.close()
+            self.__writer__ = None
+            if commit:
+                os.replace(self.__file_path__ + '.tmp', self.__file_path__)
+            else:
+                os.remove(self.__file_path__ + '.tmp')
+        return
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(commit=exc_type is None)
+        return False
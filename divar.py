@@ -2,26 +2,41 @@ import time
 import random
 import json
 import os
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, WebDriverException, TimeoutException
+from concurrent.futures import ThreadPoolExecutor
+try:
+    # selenium is only needed by the browser mode of get_posts_url.
+    from selenium import webdriver
+    from selenium.common.exceptions import NoSuchElementException, WebDriverException, TimeoutException
+except ImportError:
+    webdriver = None
 from bs4 import BeautifulSoup
 from datetime import datetime
 import simple_request
+import post_parser
+import item_store
+import crawl_state
+import post_dates
 import jalali
 from persiantext import PersianText
 
 class Divar:
-    def __init__(self, city, category):
+    def __init__(self, city, category, parser=None, base_url='https://divar.ir'):
+        """
+        parser: HTML parser backend of post pages; 'selectolax', 'lxml' or 'bs4'. the fastest installed one is used if it is None.
+        base_url: address of divar. it is only changed to crawl a local stand-in server in benchmarks.
+        """
         self.__city__ = city
         self.__category__ = category
+        self.__base_url__ = base_url
+        self.__parser__ = post_parser.get_backend(parser)
         return
 
     def get_url(self, city=None, category=None):
         city = self.__city__ if city is None else city
         category = self.__category__ if category is None else category
-        return 'https://divar.ir/s/{}/{}'.format(city, category)
+        return '{}/s/{}/{}'.format(self.__base_url__, city, category)
 
-    def get_post_info(self, post_url, verbose=True):
+    def get_post_info(self, post_url, verbose=True, rate_limiter=None, session=None):
         post_url = post_url.replace('\n', '')
         if verbose:
             print('** get_post_info:', post_url)
@@ -30,31 +45,67 @@ class Divar:
         post_values['post_id'] = post_url.split('/')[-1]
 
         try:
-            url = 'https://divar.ir{}'.format(post_url)
-            post = BeautifulSoup(simple_request.simple_get(url), 'html.parser')
+            url = '{}{}'.format(self.__base_url__, post_url)
+            html = simple_request.simple_get(url, rate_limiter=rate_limiter, session=session)
+            if html is None:
+                return None
             post_values['get_date'] = str(datetime.now().date())
-            post_values['post_date'] = post.find('span', class_='post-header__publish-time').text
-            post_types = post.find_all('div', class_='section')
-            if post_types:
-                post_values['main_category']  = post_types[-2].text
-                post_values['sub_category'] = post_types[-1].text
-            post_fields = post.find_all('div', class_='post-fields-item')
-            for pf in post_fields:
-                try:
-                    post_values[pf.span.text] = pf.div.text if pf.div else pf.a.text if pf.a else None
-                except AttributeError:
-                    continue
+            post_parser.parse_post_page(html, post_values, backend=self.__parser__)
         except AttributeError:
             pass
         except Exception:
             return None
         return post_values
 
-    def get_posts_url(self, city=None, category=None, max_pages=1, post_date_before='دیروز', file_path=None, verbose=True):
+    @staticmethod
+    def parse_listing_page(page_source):
+        """
+        Returns (href, text) of all posts in a listing page. text is the text of the post card, including its post time.
+        """
+        posts_html = BeautifulSoup(page_source, 'html.parser')
+        posts_div = posts_html.find('div', class_='browse-post-list')
+        posts_a = posts_div.find_all('a', class_='col-xs-12')
+        return [(pa['href'], pa.text) for pa in posts_a]
+
+    @staticmethod
+    def parse_posts_href(page_source):
+        """
+        Returns href of all posts in a listing page.
+        """
+        return [href for href, _ in Divar.parse_listing_page(page_source)]
+
+    def get_posts_url(self, city=None, category=None, max_pages=1, post_date_before='دیروز', file_path=None, mode='http', rate=1, incremental=False, watermark_file_path=None, verbose=True):
+        """
+        Collects href of posts, newest first, until a post as old as post_date_before (e.g. 'دیروز', see post_dates.is_older)
+        or older, or max_pages is reached.
+        mode: 'http' fetches listing pages directly and appends hrefs to file_path as they are found.
+              'browser' scrolls the listing in Firefox by selenium and writes file_path at the end.
+              an incremental run appends to file_path, so posts of an earlier run of the day are kept.
+        rate: maximum number of listing pages fetched per second in http mode.
+        incremental: only posts which are not collected in previous runs are returned, and in http mode collection stops
+              when the listing reaches them. post_date_before still stops the first run, whose watermark is empty.
+        watermark_file_path: high-water mark of incremental runs. default is ./data/{city}--{category}.hwm.
+        """
         url = self.get_url(city, category)
+        watermark = None
+        if incremental:
+            if watermark_file_path is None:
+                watermark_file_path = './data/{}--{}.hwm'.format(self.__city__ if city is None else city, self.__category__ if category is None else category)
+            watermark = crawl_state.ListingWatermark(watermark_file_path)
 
         if verbose:
-            print('** get_posts_url:', url)
+            print('** get_posts_url:', url, mode)
+
+        if mode == 'http':
+            posts_href = self.get_posts_url_http(url, max_pages=max_pages, post_date_before=post_date_before, file_path=file_path,
+                                                 rate=rate, watermark=watermark, verbose=verbose)
+            if watermark is not None:
+                watermark.update([crawl_state.post_id_of(href) for href in posts_href])
+            return posts_href
+        elif mode != 'browser':
+            raise ValueError('mode should be http or browser')
+        if webdriver is None:
+            raise ImportError('selenium is needed for browser mode of get_posts_url')
 
         try:
             browser = webdriver.Firefox(firefox_binary = '/opt/firefox-dev/firefox')
@@ -80,7 +131,7 @@ class Divar:
                 div_index = 24 * (pages-1) + div_index_offset
                 try:
                     post_time_div = browser.find_element_by_xpath('/html/body/div[1]/div[2]/main/div[1]/div[2]/a[{}]/div[1]/div[3]'.format(div_index))
-                    if post_date_before in post_time_div.text:
+                    if post_dates.is_older(post_time_div.text, post_date_before):
                         break
                 except NoSuchElementException:
                     if verbose:
@@ -95,21 +146,90 @@ class Divar:
                     print('{} Page {}/{}, {}'.format(match, pages, max_pages, PersianText.reshape(post_time_div.text)))
 
             time.sleep(3)
-            posts_html = BeautifulSoup(browser.page_source, 'html.parser')
-            posts_div = posts_html.find('div', class_='browse-post-list')
-            posts_a = posts_div.find_all('a', class_='col-xs-12')
-            posts_href = [pa['href'] for pa in posts_a]
+            posts_href = self.parse_posts_href(browser.page_source)
+            if watermark is not None:
+                posts_href = [href for href in posts_href if not watermark.is_known(crawl_state.post_id_of(href))]
+                watermark.update([crawl_state.post_id_of(href) for href in posts_href])
             
             if file_path:
-                with open(file_path, 'w') as fp:
-                    fp.write('\n'.join(posts_href))
+                # an incremental run adds its posts to the ones of earlier runs of the day, which may not be crawled yet.
+                with open(file_path, 'a' if watermark is not None else 'w') as fp:
+                    fp.write(''.join(href + '\n' for href in posts_href))
             return posts_href
         except TimeoutException:
             return None
         except WebDriverException:
             return None
 
-    def browse_and_save_items(self, urls_file_path, items_file_path, from_index, to_index=None, verbose=True):
+    def get_posts_url_http(self, url, max_pages=1, post_date_before='دیروز', file_path=None, rate=1, watermark=None, verbose=True):
+        """
+        Fetches listing pages url?page=1, url?page=2, ... over HTTP, without a browser.
+        Stops at max_pages, at a page without new posts, or after a page which has a post as old as post_date_before or older.
+        Each href is appended to file_path as soon as its page is parsed. file_path is truncated first, unless watermark is given.
+        watermark: a crawl_state.ListingWatermark. known posts are skipped and collection stops after the first page
+                   which is mostly known. post_date_before is ignored when it is given, unless it has no known posts yet
+                   (the first incremental run).
+        """
+        rate_limiter = simple_request.RateLimiter(rate) if rate else None
+        session = simple_request.create_session(pool_size=1)
+        posts_href = []
+        seen_href = set()
+        # an empty watermark is never reached, so the first incremental run stops at post_date_before.
+        use_post_date = watermark is None or len(watermark) == 0
+        # with a watermark, earlier runs of the day are known and their posts, which may not be crawled yet, are kept.
+        fp = open(file_path, 'a' if watermark is not None else 'w') if file_path else None
+        try:
+            for page in range(1, max_pages + 1):
+                page_source = simple_request.simple_get('{}?page={}'.format(url, page), rate_limiter=rate_limiter, session=session)
+                if page_source is None:
+                    if verbose:
+                        print('Page', page, 'ERROR! Page not found!')
+                    break
+                try:
+                    posts = self.parse_listing_page(page_source)
+                except AttributeError:
+                    # there is no post list in the page
+                    break
+                new_href = [href for href, _ in posts if href not in seen_href]
+                if not new_href:
+                    break
+                seen_href.update(new_href)
+                reached = False
+                if watermark is not None:
+                    post_ids = [crawl_state.post_id_of(href) for href in new_href]
+                    reached = watermark.reached(post_ids)
+                    new_href = [href for href, post_id in zip(new_href, post_ids) if not watermark.is_known(post_id)]
+                posts_href.extend(new_href)
+                if fp:
+                    fp.write(''.join(href + '\n' for href in new_href))
+                    fp.flush()
+                if verbose:
+                    print('Page {}/{}, {} posts'.format(page, max_pages, len(posts_href)))
+                if reached:
+                    break
+                if use_post_date and post_date_before and any(post_dates.is_older(text, post_date_before) for _, text in posts):
+                    break
+        finally:
+            session.close()
+            if fp:
+                fp.close()
+        return posts_href
+
+    def browse_and_save_items(self, urls_file_path, items_file_path, from_index=0, to_index=None, workers=1, rate=None, journal_file_path=None, max_attempts=3, progress=None, dedup_index_file_path=None, verbose=True):
+        """
+        workers: number of threads fetching posts concurrently.
+        rate: maximum number of requests per second sent to divar.ir. None means no limit.
+        Items are saved in the order of URLs in urls_file_path, whatever the number of workers.
+        If items_file_path ends with .jsonl, each item is appended to it as soon as it is fetched,
+        otherwise the whole file is loaded and rewritten as a JSON array at the end.
+        journal_file_path: crawl journal of finished and failed posts. default is items_file_path with .state extension.
+        Posts which are done in the journal, or failed max_attempts times, and repeated URLs are not fetched again,
+        so a stopped crawl can be restarted with the same arguments.
+        progress: an optional function which is called as progress(done, total) after each post is fetched.
+        dedup_index_file_path: a crawl_state.DedupIndex shared by the snapshots of a (city, category), e.g. ./data/{city}--{category}.dedup.
+              Posts seen in other snapshots are not fetched again, and fetched reposts of known ads get a duplicate_of field
+              with the post_id of the original.
+        """
         if verbose:
             print('** browse_and_save_items:', urls_file_path, items_file_path)
             
@@ -120,24 +240,93 @@ class Divar:
         with open(urls_file_path, 'r') as fp:
             posts_url = fp.readlines()
 
-        if os.path.exists(items_file_path):
-            fp = open(items_file_path, 'r')
-            posts_items = json.load(fp)
-            fp.close()
+        store = None
+        if item_store.is_json_lines(items_file_path):
+            store = item_store.JsonLinesStore(items_file_path).open()
+            save_items = store.append
         else:
-            posts_items = []
+            if os.path.exists(items_file_path):
+                fp = open(items_file_path, 'r')
+                posts_items = json.load(fp)
+                fp.close()
+            else:
+                posts_items = []
+            save_items = posts_items.append
 
         if to_index is None:
             to_index = len(posts_url)
-        for url in posts_url[from_index:to_index]:
-            items = self.get_post_info(url)
+        rate_limiter = simple_request.RateLimiter(rate) if rate else None
+        # one keep-alive connection per worker to avoid a new TLS handshake for every post.
+        session = simple_request.create_session(pool_size=max(workers, 1))
+
+        def fetch(url):
+            return self.get_post_info(url, verbose=verbose, rate_limiter=rate_limiter, session=session)
+
+        if journal_file_path is None:
+            journal_file_path = os.path.splitext(items_file_path)[0] + '.state'
+        journal = crawl_state.CrawlJournal(journal_file_path, max_attempts=max_attempts).open()
+        dedup_index = crawl_state.DedupIndex(dedup_index_file_path).open() if dedup_index_file_path else None
+        source = os.path.splitext(os.path.basename(items_file_path))[0]
+
+        selected_urls = posts_url[from_index:to_index]
+        urls = []
+        url_post_ids = set()
+        for url in selected_urls:
+            post_id = crawl_state.post_id_of(url)
+            if not post_id or post_id in url_post_ids or not journal.should_fetch(post_id):
+                continue
+            if dedup_index is not None and dedup_index.duplicate_of(post_id, None, source) is not None:
+                continue
+            url_post_ids.add(post_id)
+            urls.append(url)
+        if verbose:
+            print('** {} of {} posts are skipped.'.format(len(selected_urls) - len(urls), len(selected_urls)))
+
+        # posts of a .json items file are marked done only after the file is written.
+        done_post_ids = []
+        fetched = [0]
+        def save(url, items):
             if items:
-                posts_items.append(items)
-            # time.sleep(random.random())
-            # time.sleep(random.randint(0, 2))
-        posts_items_str = json.dumps(posts_items)
-        with open(items_file_path, 'w') as fp:
-            fp.write(posts_items_str)
+                if dedup_index is not None:
+                    fingerprint = crawl_state.post_fingerprint(items)
+                    original = dedup_index.duplicate_of(items['post_id'], fingerprint, source)
+                    if original is not None:
+                        items['duplicate_of'] = original
+                    dedup_index.add(items['post_id'], fingerprint, source)
+                save_items(items)
+                if store is not None:
+                    journal.mark_done(items['post_id'])
+                else:
+                    done_post_ids.append(items['post_id'])
+            else:
+                journal.mark_failed(crawl_state.post_id_of(url))
+            if progress is not None:
+                fetched[0] += 1
+                progress(fetched[0], len(urls))
+            return
+
+        try:
+            if workers > 1:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    # executor.map yields results in the order of urls.
+                    for url, items in zip(urls, executor.map(fetch, urls)):
+                        save(url, items)
+            else:
+                for url in urls:
+                    save(url, fetch(url))
+            if store is None:
+                posts_items_str = json.dumps(posts_items)
+                with open(items_file_path, 'w') as fp:
+                    fp.write(posts_items_str)
+                for post_id in done_post_ids:
+                    journal.mark_done(post_id)
+        finally:
+            session.close()
+            if dedup_index is not None:
+                dedup_index.close()
+            if store is not None:
+                store.close()
+            journal.close()
 
         print('*** Last index:', to_index)
         if to_index >= len(posts_url):
@@ -155,50 +344,12 @@ if __name__ == "__main__":
     gd = str(datetime.now().date())
     jd = jalali.Gregorian(gd).persian_string(date_format='{}{:02d}{:02d}')
     urls_file_path = './data/{}--{}--{}.url'.format(city, category, jd)
-    items_file_path = './data/{}--{}--{}.json'.format(city, category, jd)
+    items_file_path = './data/{}--{}--{}.jsonl'.format(city, category, jd)
 
     divar = Divar(city=city, category=category)
-    # divar.get_posts_url(city=city, category=category, max_pages=3000, post_date_before='هفتهٔ پیش', file_path=urls_file_path)
-
-    divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=13000, to_index=14000)
-
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=0, to_index=1000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=1000, to_index=2000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=2000, to_index=3000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=3000, to_index=4000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=4000, to_index=5000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=5000, to_index=6000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=6000, to_index=7000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=7000, to_index=8000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=8000, to_index=9000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=9000, to_index=10000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=10000, to_index=11000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=11000, to_index=12000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=12000, to_index=13000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=13000, to_index=14000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=14000, to_index=15000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=15000, to_index=16000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=16000, to_index=17000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=17000, to_index=18000)
-    # time.sleep(random.randint(10, 20))
-    # *divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, from_index=18000)
+    # divar.get_posts_url(city=city, category=category, max_pages=3000, post_date_before='هفتهٔ پیش', file_path=urls_file_path, rate=1, incremental=True)
+
+    divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path, workers=8, rate=4)
 
     # posts = divar.get_posts_url(max_pages=3)
     # print(len(posts))
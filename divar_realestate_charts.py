@@ -8,10 +8,16 @@ from matplotlib.gridspec import GridSpec
 from mpl_toolkits.mplot3d import Axes3D
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import MinMaxScaler
-from datetime import datetime
 import os
+import glob
+import json
+import tempfile
 from persiantext import PersianText
-import jalali
+import item_store
+import dataset_cache
+import stats_cube
+import crawl_state
+import price_index
 
 # >>>>>>>>>> globals <<<<<<<<<<
 __FONT__ = './resources/IRANSansWeb(FaNum).ttf'
@@ -27,10 +33,8 @@ def get_font_properties(fontsize=10):
     return fm.FontProperties(fname=__FONT__, size=fontsize)
 
 def convert_persian_digits_to_latin(s):
-    digits = {'۰':'0', '۱':'1', '۲':'2', '۳':'3', '۴':'4', '۵':'5', '۶':'6', '۷':'7', '۸':'8', '۹':'9'}
     if type(s) == str:
-        for pd in digits.keys():
-            s = s.replace(pd, digits[pd])
+        s = s.translate(PERSIAN_DIGITS_TABLE)
     return s
 
 def reshape_axes_labels(ax, reshape_x=True, reshape_y=False, fontsize=10):
@@ -49,8 +53,12 @@ def reshape_axes_labels(ax, reshape_x=True, reshape_y=False, fontsize=10):
         ax.set_yticklabels(yt)
     return
 
-def stacked_bar(stacked_group, x, data, title=None, grid_cell=None, figsize=None):
-    agg = data.groupby(by=[stacked_group, x]).count().iloc[:,0]
+def stacked_bar(stacked_group, x, data, title=None, grid_cell=None, figsize=None, counts=None):
+    """
+    counts: non-null values by [stacked_group, x], like the count of the first other column of data,
+            e.g. of StatsCube.counts(..., column=...). data is not used if it is given.
+    """
+    agg = counts if counts is not None else data.groupby(by=[stacked_group, x]).count().iloc[:,0]
     agg = agg.unstack().T.fillna(0)
     
     bottom = np.zeros(len(agg))
@@ -67,19 +75,25 @@ def stacked_bar(stacked_group, x, data, title=None, grid_cell=None, figsize=None
     if title:
         ax.set_title(PersianText.reshape(title), fontproperties=get_font_properties(20), pad=10)
         
-    reshaped_cols = [PersianText.reshape(col) for col in agg.columns]
+    reshaped_cols = PersianText.reshape_many(agg.columns)
     ax.legend(labels=reshaped_cols, prop=get_font_properties(15))
     ax.set_xticklabels(agg.index, rotation=45, horizontalalignment='right')
     reshape_axes_labels(ax, fontsize=13)
     return
 
-def count_bar(values, title=None, xlabel=None, ylabel=None, grid_cell=None, figsize=None):
+def count_bar(values, title=None, xlabel=None, ylabel=None, grid_cell=None, figsize=None, counts=None):
+    """
+    counts: number of rows by category, e.g. of StatsCube.counts. values is not used if it is given.
+    """
     if grid_cell:
         ax = plt.subplot(grid_cell)
     else:
         plt.figure(figsize=figsize)
         ax = plt.subplot()
-    ax = sns.countplot(x=values)
+    if counts is not None:
+        ax = sns.barplot(x=counts.index.to_series(), y=counts.to_numpy())
+    else:
+        ax = sns.countplot(x=values)
     reshape_axes_labels(ax, fontsize=10)
     plt.xticks(rotation=45, horizontalalignment='right')
     if title:
@@ -90,13 +104,19 @@ def count_bar(values, title=None, xlabel=None, ylabel=None, grid_cell=None, figs
         plt.ylabel(PersianText.reshape(ylabel), fontproperties=get_font_properties(20))
     return
 
-def mean_bar(x, y, data, title=None, xlabel=None, ylabel=None, grid_cell=None, figsize=None):
+def mean_bar(x, y, data, title=None, xlabel=None, ylabel=None, grid_cell=None, figsize=None, means=None):
+    """
+    means: mean of y by x, e.g. of StatsCube.means. data is not used if it is given.
+    """
     if grid_cell:
         ax = plt.subplot(grid_cell)
     else:
         plt.figure(figsize=figsize)
         ax = plt.subplot()        
-    ax = sns.barplot(x=x, y=y, data=data, errwidth=0)
+    if means is not None:
+        ax = sns.barplot(x=means.index.to_series(), y=means.to_numpy(), errorbar=None)
+    else:
+        ax = sns.barplot(x=x, y=y, data=data, errorbar=None)
     reshape_axes_labels(ax, fontsize=10)
     plt.xticks(rotation=45, horizontalalignment='right')
     if title:
@@ -107,13 +127,38 @@ def mean_bar(x, y, data, title=None, xlabel=None, ylabel=None, grid_cell=None, f
         plt.ylabel(PersianText.reshape(ylabel), fontproperties=get_font_properties(20))
     return
 
-def swarm(x, y, data, hue=None, title=None, xlabel=None, ylabel=None, legend_title=None, grid_cell=None, figsize=None):
+# above this number of points, swarm draws a stratified sample as a strip plot instead of a swarm plot,
+# whose point placement gets slow (and overlaps points anyway) on large datasets.
+SWARM_MAX_POINTS = 2000
+
+def stratified_sample(data, by, n, seed=0):
+    """
+    Returns about n rows of data, sampling each group of `by` columns in proportion to its size.
+    Every group keeps at least one row, so small groups do not disappear from the chart. The seed makes charts reproducible.
+    """
+    if len(data) <= n:
+        return data
+    rng = np.random.default_rng(seed)
+    shuffled = data.iloc[rng.permutation(len(data))]
+    groups = shuffled.groupby(by=by, observed=True, dropna=False)
+    keep = groups.cumcount() < np.maximum(1, np.round(groups.transform('size') * n / len(data)))
+    return shuffled[keep.to_numpy()].sort_index()
+
+def swarm(x, y, data, hue=None, title=None, xlabel=None, ylabel=None, legend_title=None, grid_cell=None, figsize=None,
+          max_points=SWARM_MAX_POINTS, seed=0, sampled=False):
+    """
+    sampled: data is already a sample of a larger dataset (see StatsCube.points), so it is drawn as a strip plot.
+    """
     if grid_cell:
         ax = plt.subplot(grid_cell)
     else:
         plt.figure(figsize=figsize)
         ax = plt.subplot()        
-    ax = sns.swarmplot(x=x, y=y, data=data, hue=hue)
+    if not sampled and (max_points is None or len(data) <= max_points):
+        ax = sns.swarmplot(x=x, y=y, data=data, hue=hue)
+    else:
+        sample = data if sampled else stratified_sample(data, by=[x, hue] if hue else [x], n=max_points, seed=seed)
+        ax = sns.stripplot(x=x, y=y, data=sample, hue=hue, jitter=0.4, size=4, alpha=0.7)
     reshape_axes_labels(ax, fontsize=10)
     plt.xticks(rotation=45, horizontalalignment='right')
     if title:
@@ -145,113 +190,139 @@ def heatmap(data, title=None, xlabel=None, ylabel=None, cbar_label='', grid_cell
         plt.ylabel(PersianText.reshape(ylabel), fontproperties=get_font_properties(20))
     return
 
-def prepare_datasets(posts_json_file, city_name_fa):
-    df = pd.read_json(posts_json_file)
-
-    filter_cols = ['post_id', 'get_date', 'post_date', 'main_category', 'sub_category',
-                'دسته‌بندی', 'محل', 'متراژ', 'سال ساخت', 'تعداد اتاق', 'ودیعه',
-                'اجاره', 'قیمت کل', 'قیمت هر متر']
-    df = df[filter_cols]
-    df.columns = ['post_id', 'get_date', 'post_date', 'main_category', 'sub_category',
-                'category', 'location', 'area', 'build_year', 'rooms', 'mortgage', 'rent',
-                'sell_price', 'sell_unit_price']
-
-    df['area'] = df['area'].apply(lambda x: convert_persian_digits_to_latin(x))
-    df['area'] = df['area'].apply(lambda x: x.replace(' متر', '') if type(x) == str else x)
-    df['area'] = df['area'].apply(lambda x: x.replace('٫', '') if type(x) == str else x)
-    df['area'] = df['area'].str.strip().astype('float')
-
-    df['build_year'] = df['build_year'].apply(lambda x: convert_persian_digits_to_latin(x))
-    df['build_year'] = df['build_year'].apply(lambda x: x.replace('قبل از ', '') if type(x) == str else x)
-    df['build_year'] = df['build_year'].str.strip().astype('float').astype('Int16')
+AREA_CAT_BINS = (0, 100, 200, 300, 400, 500, np.inf)
+AREA_CAT_LABELS = (
+    'کمتر از ۱۰۰',
+    'از ۱۰۰ تا ۲۰۰',
+    'از ۲۰۰ تا ۳۰۰',
+    'از ۳۰۰ تا ۴۰۰',
+    'از ۴۰۰ تا ۵۰۰',
+    'بیشتر از ۵۰۰')
+
+AGE_CAT_BINS = (-1, 5, 10, 15, 20, 25, 30, np.inf)
+AGE_CAT_LABELS = (
+    'کمتر از ۵',
+    'از ۵ تا ۱۰',
+    'از ۱۰ تا ۱۵',
+    'از ۱۵ تا ۲۰',
+    'از ۲۰ تا ۲۵',
+    'از ۲۵ تا ۳۰',
+    'بیشتر از ۳۰')
+
+SELL_UNIT_PRICE_CAT_BINS = (0, 2000000, 4000000, 6000000, 8000000, 10000000, np.inf)
+SELL_UNIT_PRICE_CAT_LABELS = (
+    'کمتر از ۲ میلیون',
+    'از ۲ تا ۴ میلیون',
+    'از ۴ تا ۶ میلیون',
+    'از ۶ تا ۸ میلیون',
+    'از ۸ تا ۱۰ میلیون',
+    'بیشتر از ۱۰ میلیون')
+
+RENT_UNIT_PRICE_CAT_BINS = (-1, 25000, 50000, 75000, 100000, 200000, 300000, np.inf)
+RENT_UNIT_PRICE_CAT_LABELS = (
+    'کمتر از ۲۵ هزار',
+    'از ۲۵ تا ۵۰ هزار',
+    'از ۵۰ تا ۷۵ هزار',
+    'از ۷۵ تا ۱۰۰ هزار',
+    'از ۱۰۰ تا ۲۰۰ هزار',
+    'از ۲۰۰ تا ۳۰۰ هزار',
+    'بیشتر از ۳۰۰ هزار',
+)
+
+# raw post field -> dataset column
+RAW_COLUMNS = {'post_id': 'post_id', 'get_date': 'get_date', 'post_date': 'post_date', 'main_category': 'main_category',
+               'sub_category': 'sub_category', 'دسته‌بندی': 'category', 'محل': 'location', 'متراژ': 'area',
+               'سال ساخت': 'build_year', 'تعداد اتاق': 'rooms', 'ودیعه': 'mortgage', 'اجاره': 'rent',
+               'قیمت کل': 'sell_price', 'قیمت هر متر': 'sell_unit_price'}
+
+PERSIAN_DIGITS_TABLE = str.maketrans('۰۱۲۳۴۵۶۷۸۹', '0123456789')
+
+# how each text column is turned into numbers. steps run in this order:
+# digits: Persian digits to Latin, replace: (old, new) pairs, remove: substrings, na_values: whole values meaning no value.
+__PRICE_SPEC__ = {'digits': True, 'remove': (' تومان', '٫'), 'na_values': ('توافقی', 'مجانی'), 'dtype': 'float'}
+COLUMN_SPECS = {
+    'area': {'digits': True, 'remove': (' متر', '٫'), 'dtype': 'float'},
+    'build_year': {'digits': True, 'remove': ('قبل از ',), 'dtype': 'Int16'},
+    'rooms': {'replace': (('بدون اتاق', '0'), ('یک', '1'), ('دو', '2'), ('سه', '3'), ('چهار', '4'), ('پنج یا بیشتر', '5')),
+              'dtype': 'Int16'},
+    'sell_price': __PRICE_SPEC__,
+    'sell_unit_price': __PRICE_SPEC__,
+    'mortgage': __PRICE_SPEC__,
+    'rent': __PRICE_SPEC__,
+}
+
+# this is just for Isfahan
+SUBURBS = ['شاهین شهر', 'بهارستان', 'فولادشهر', 'خمینی شهر', 'شهرضا', 'مبارکه', 'زرین‌شهر', 'تیران', 'گز', 'میمه']
+
+def normalize_column(values, spec):
+    """
+    Converts a text column to numbers by vectorized pandas .str methods, as described by a COLUMN_SPECS item.
+    A column has far fewer distinct values than rows, so the distinct values are converted once
+    and spread back to the rows by their factorize codes.
+    """
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques, dtype=object)
+    if spec.get('digits'):
+        uniques = uniques.str.translate(PERSIAN_DIGITS_TABLE)
+    for old, new in spec.get('replace', ()):
+        uniques = uniques.str.replace(old, new, regex=False)
+    for old in spec.get('remove', ()):
+        uniques = uniques.str.replace(old, '', regex=False)
+    if spec.get('na_values'):
+        uniques = uniques.replace(list(spec['na_values']), np.nan)
+    numbers = uniques.str.strip().astype('float').to_numpy()
+    # code -1 of missing values takes the NaN appended to the end.
+    numbers = np.append(numbers, np.nan)[codes]
+    values = pd.Series(numbers, index=values.index, name=values.name)
+    if spec['dtype'] != 'float':
+        values = values.astype(spec['dtype'])
+    return values
+
+def load_posts(posts_json_file):
+    if item_store.is_json_lines(posts_json_file):
+        # read line by line instead of parsing one giant JSON array. a broken last line of a crashed crawl is skipped.
+        return pd.DataFrame.from_records(item_store.read_items(posts_json_file))
+    return pd.read_json(posts_json_file)
+
+def normalize_posts(df, city_name_fa):
+    """
+    Renames raw post fields to dataset columns and converts them to numbers and categories.
+    """
+    df = df[list(RAW_COLUMNS.keys())]
+    df.columns = list(RAW_COLUMNS.values())
+
+    for col, spec in COLUMN_SPECS.items():
+        df[col] = normalize_column(df[col], spec)
     df['age'] = __BASE_YEAR__ - df['build_year']
     df['age'] = df['age'].astype('float')
 
     CNAME = city_name_fa + '، '
-    df['location'] = df['location'].apply(lambda x: x.replace(CNAME, '') if type(x) == str else x)
+    df['location'] = df['location'].str.replace(CNAME, '', regex=False)
 
     df['main_category'] = df['main_category'].fillna('')
-
-    df['ad_type'] = df['main_category'].apply(lambda x: __RENT_STR__ if __RENT_STR__ in x else __SELL_STR__ if __SELL_STR__ in x else __OTHER_STR__)
-
-    rooms = {'بدون اتاق':'0',
-            'یک':'1',
-            'دو':'2',
-            'سه':'3',
-            'چهار':'4',
-            'پنج یا بیشتر':'5'}
-    for r in rooms.keys():
-        df['rooms'] = df['rooms'].apply(lambda x: x.replace(r, rooms[r]) if type(x) == str else x)
-    df['rooms'] = df['rooms'].str.strip().astype('float').astype('Int16')
-
-    df['sell_price'] = df['sell_price'].apply(lambda x: convert_persian_digits_to_latin(x))
-    df['sell_price'] = df['sell_price'].apply(lambda x: x.replace(' تومان', '') if type(x) == str else x)
-    df['sell_price'] = df['sell_price'].apply(lambda x: x.replace('٫', '') if type(x) == str else x)
-    df['sell_price'] = df['sell_price'].replace('توافقی', np.nan)
-    df['sell_price'] = df['sell_price'].replace('مجانی', np.nan)
-    df['sell_price'] = df['sell_price'].str.strip().astype('float')#.astype('Int64')
-
-    df['sell_unit_price'] = df['sell_unit_price'].apply(lambda x: convert_persian_digits_to_latin(x))
-    df['sell_unit_price'] = df['sell_unit_price'].apply(lambda x: x.replace(' تومان', '') if type(x) == str else x)
-    df['sell_unit_price'] = df['sell_unit_price'].apply(lambda x: x.replace('٫', '') if type(x) == str else x)
-    df['sell_unit_price'] = df['sell_unit_price'].replace('توافقی', np.nan)
-    df['sell_unit_price'] = df['sell_unit_price'].replace('مجانی', np.nan)
-    df['sell_unit_price'] = df['sell_unit_price'].str.strip().astype('float')#.astype('Int64')
-
-    df['mortgage'] = df['mortgage'].apply(lambda x: convert_persian_digits_to_latin(x))
-    df['mortgage'] = df['mortgage'].apply(lambda x: x.replace(' تومان', '') if type(x) == str else x)
-    df['mortgage'] = df['mortgage'].apply(lambda x: x.replace('٫', '') if type(x) == str else x)
-    df['mortgage'] = df['mortgage'].replace('توافقی', np.nan)
-    df['mortgage'] = df['mortgage'].replace('مجانی', np.nan)
-    df['mortgage'] = df['mortgage'].str.strip().astype('float')#.astype('Int64')
-
-    df['rent'] = df['rent'].apply(lambda x: convert_persian_digits_to_latin(x))
-    df['rent'] = df['rent'].apply(lambda x: x.replace(' تومان', '') if type(x) == str else x)
-    df['rent'] = df['rent'].apply(lambda x: x.replace('٫', '') if type(x) == str else x)
-    df['rent'] = df['rent'].replace('توافقی', np.nan)
-    df['rent'] = df['rent'].replace('مجانی', np.nan)
-    df['rent'] = df['rent'].str.strip().astype('float')#.astype('Int64')
-
-    area_cat_labels = (
-        'کمتر از ۱۰۰',
-        'از ۱۰۰ تا ۲۰۰',
-        'از ۲۰۰ تا ۳۰۰',
-        'از ۳۰۰ تا ۴۰۰',
-        'از ۴۰۰ تا ۵۰۰',
-        'بیشتر از ۵۰۰')
-    df['area_cat'] = pd.cut(df['area'], bins=(0, 100, 200, 300, 400, 500, np.inf), labels=area_cat_labels)
-
-    age_cat_labels = (
-        'کمتر از ۵',
-        'از ۵ تا ۱۰',
-        'از ۱۰ تا ۱۵',
-        'از ۱۵ تا ۲۰',
-        'از ۲۰ تا ۲۵',
-        'از ۲۵ تا ۳۰',
-        'بیشتر از ۳۰')
-    df['age_cat'] = pd.cut(df['age'], bins=(-1, 5, 10, 15, 20, 25, 30, np.inf), labels=age_cat_labels)
-
+    is_rent = df['main_category'].str.contains(__RENT_STR__, regex=False)
+    is_sell = df['main_category'].str.contains(__SELL_STR__, regex=False)
+    df['ad_type'] = np.where(is_rent, __RENT_STR__, np.where(is_sell, __SELL_STR__, __OTHER_STR__))
+
+    df['area_cat'] = pd.cut(df['area'], bins=AREA_CAT_BINS, labels=AREA_CAT_LABELS)
+    df['age_cat'] = pd.cut(df['age'], bins=AGE_CAT_BINS, labels=AGE_CAT_LABELS)
+    return df
+
+def select_total(df):
+    """
+    Returns posts of a normalized dataset which have a price, out of suburbs.
+    """
     df2 = df[['location', 'sub_category', 'ad_type', 'age', 'rooms', 'area', 'sell_price', 'sell_unit_price', 'mortgage', 'rent', 'area_cat', 'age_cat']].copy()
     df2 = df2[(~df2['sell_price'].isnull()) | (~df2['sell_unit_price'].isnull()) | (~df2['mortgage'].isnull()) | (~df2['rent'].isnull())]
+    df2 = df2[~df2['location'].isin(SUBURBS)]
+    return df2
 
-    # this is just for Isfahan
-    suburbs = ['شاهین شهر', 'بهارستان', 'فولادشهر', 'خمینی شهر', 'شهرضا', 'مبارکه', 'زرین‌شهر', 'تیران', 'گز', 'میمه']
-    for town in suburbs:
-        df2 = df2[df2['location'] != town]
-
+def split_sell_rent(df2):
     df_sell = df2[df2['ad_type'] == __SELL_STR__].copy()
     del df_sell['mortgage']
     del df_sell['rent']
     df_sell = df_sell.dropna()
-
-    sell_unit_price_cat_labels = (
-        'کمتر از ۲ میلیون',
-        'از ۲ تا ۴ میلیون',
-        'از ۴ تا ۶ میلیون',
-        'از ۶ تا ۸ میلیون',
-        'از ۸ تا ۱۰ میلیون',
-        'بیشتر از ۱۰ میلیون')
-    df_sell['sell_unit_price_cat'] = pd.cut(df_sell['sell_unit_price'], bins=(0, 2000000, 4000000, 6000000, 8000000, 10000000, np.inf), labels=sell_unit_price_cat_labels)
+    df_sell['sell_unit_price_cat'] = pd.cut(df_sell['sell_unit_price'], bins=SELL_UNIT_PRICE_CAT_BINS, labels=SELL_UNIT_PRICE_CAT_LABELS)
 
     df_rent = df2[df2['ad_type'] == __RENT_STR__].copy()
     del df_rent['sell_price']
@@ -261,167 +332,366 @@ def prepare_datasets(posts_json_file, city_name_fa):
     df_rent['rent_unit_price'] = (0.03 * df_rent['mortgage'] + df_rent['rent']) / df_rent['area']
     df_rent['rent_unit_price'] = np.round(df_rent['rent_unit_price'])
     df_rent = df_rent.dropna()
-
-    rent_unit_price_cat_labels = (
-        'کمتر از ۲۵ هزار',
-        'از ۲۵ تا ۵۰ هزار',
-        'از ۵۰ تا ۷۵ هزار',
-        'از ۷۵ تا ۱۰۰ هزار',
-        'از ۱۰۰ تا ۲۰۰ هزار',
-        'از ۲۰۰ تا ۳۰۰ هزار',
-        'بیشتر از ۳۰۰ هزار',
-    )
-    df_rent['rent_unit_price_cat'] = pd.cut(df_rent['rent_unit_price'], bins=(-1, 25000, 50000, 75000, 100000, 200000, 300000, np.inf), labels=rent_unit_price_cat_labels)
+    df_rent['rent_unit_price_cat'] = pd.cut(df_rent['rent_unit_price'], bins=RENT_UNIT_PRICE_CAT_BINS, labels=RENT_UNIT_PRICE_CAT_LABELS)
+    return df_sell, df_rent
+
+def drop_duplicate_posts(df, dedup_index=None, source=None, seen=None):
+    """
+    Drops copies of raw posts (of load_posts): repeated post_ids, and reposts with the same location, area,
+    price and rooms (crawl_state.post_fingerprint). The first copy is kept.
+    dedup_index: a crawl_state.DedupIndex of other snapshots. posts which are copies of posts there are dropped too,
+                 and the kept posts are added to it, with source as their source.
+    seen: a crawl_state.DedupIndex of posts kept before, to drop copies across chunks of a file.
+    """
+    seen = seen if seen is not None else crawl_state.DedupIndex()
+    columns = [df[field] if field in df.columns else [None] * len(df) for field in crawl_state.FINGERPRINT_FIELDS]
+    keep = []
+    for post_id, values in zip(df['post_id'], zip(*columns)):
+        fingerprint = crawl_state.fingerprint_of_values(values)
+        if seen.is_known(post_id) or (fingerprint is not None and seen.is_known_fingerprint(fingerprint)) or \
+           (dedup_index is not None and dedup_index.duplicate_of(post_id, fingerprint, source) is not None):
+            keep.append(False)
+            continue
+        seen.add(post_id, fingerprint, source)
+        if dedup_index is not None:
+            dedup_index.add(post_id, fingerprint, source)
+        keep.append(True)
+    return df[np.array(keep, dtype=bool)]
+
+def prepare_datasets(posts_json_file, city_name_fa, cache_dir=None, chunksize=None, dedup=False):
+    """
+    cache_dir: if it is given (and pyarrow is installed), datasets are saved there as Parquet files and
+    loaded from there while posts_json_file does not change. location, sub_category, area_cat and age_cat
+    of cached datasets are categorical.
+    chunksize: if it is given, posts are normalized chunk by chunk through a temporary store (see ingest_posts),
+    so the raw posts are never all in memory. needs pyarrow.
+    dedup: drop copies of posts in posts_json_file, see drop_duplicate_posts.
+    """
+    cache_key = city_name_fa + ('--dedup' if dedup else '')
+    cache = dataset_cache.DatasetCache(cache_dir) if cache_dir and dataset_cache.available() else None
+    if cache is not None:
+        datasets = cache.load(posts_json_file, key=cache_key)
+        if datasets is not None:
+            return datasets
+
+    if chunksize:
+        with tempfile.TemporaryDirectory() as store_dir:
+            store_file = os.path.join(store_dir, 'posts.parquet')
+            ingest_posts(posts_json_file, city_name_fa, store_file, chunksize=chunksize, dedup=dedup)
+            df2 = read_store_file(store_file)
+    else:
+        df = load_posts(posts_json_file)
+        if dedup:
+            df = drop_duplicate_posts(df)
+        df2 = select_total(normalize_posts(df, city_name_fa))
+    df_sell, df_rent = split_sell_rent(df2)
+
+    if cache is not None:
+        df2, df_sell, df_rent = [dataset_cache.to_categorical(d) for d in (df2, df_sell, df_rent)]
+        cache.save(posts_json_file, (df2, df_sell, df_rent), key=cache_key)
     return df2, df_sell, df_rent
 
-def overall_charts(data, title, chart_file):
+# columns of the ingested store. city and snapshot tell apart posts of different cities and days,
+# row is the index of a post in its items file, like the index of load_posts.
+STORE_COLUMN_TYPES = {'city': 'string', 'snapshot': 'string', 'row': 'int64', 'location': 'string', 'sub_category': 'string', 'ad_type': 'string',
+                      'age': 'float64', 'rooms': 'Int16', 'area': 'float64', 'sell_price': 'float64', 'sell_unit_price': 'float64',
+                      'mortgage': 'float64', 'rent': 'float64', 'area_cat': 'string', 'age_cat': 'string'}
+ORDERED_CATEGORIES = {'area_cat': AREA_CAT_LABELS, 'age_cat': AGE_CAT_LABELS}
+
+def iter_post_chunks(posts_json_file, chunksize=20000):
+    """
+    Yields DataFrames of at most chunksize posts, with only the fields of RAW_COLUMNS, indexed by the position of each
+    post in the file like load_posts. Posts of a .jsonl file are read line by line; a .json array has to be parsed at once (see item_store.convert_json_to_jsonl).
+    """
+    fields = list(RAW_COLUMNS.keys())
+    if item_store.is_json_lines(posts_json_file):
+        items = item_store.read_items(posts_json_file)
+    else:
+        with open(posts_json_file, 'r') as fp:
+            items = json.load(fp)
+    rows = []
+    start = 0
+    for item in items:
+        rows.append({field: item[field] for field in fields if field in item})
+        if len(rows) == chunksize:
+            yield pd.DataFrame.from_records(rows, columns=fields, index=pd.RangeIndex(start, start + len(rows)))
+            start += len(rows)
+            rows = []
+    if rows:
+        yield pd.DataFrame.from_records(rows, columns=fields, index=pd.RangeIndex(start, start + len(rows)))
+
+def ingest_posts(posts_json_file, city_name_fa, store_file, chunksize=20000, city=None, snapshot=None, dedup=False, dedup_index=None):
+    """
+    Normalizes posts chunk by chunk and appends them to a Parquet file, so peak memory depends on chunksize
+    rather than the size of posts_json_file. Rows are the same as select_total of the whole file.
+    dedup: drop copies of posts, see drop_duplicate_posts. dedup_index: a crawl_state.DedupIndex of other snapshots.
+    Returns number of rows written.
+    """
+    seen = crawl_state.DedupIndex()
+    with dataset_cache.ParquetStore(store_file, STORE_COLUMN_TYPES) as store:
+        for chunk in iter_post_chunks(posts_json_file, chunksize):
+            if dedup or dedup_index is not None:
+                chunk = drop_duplicate_posts(chunk, dedup_index=dedup_index, source=snapshot, seen=seen)
+            df2 = select_total(normalize_posts(chunk, city_name_fa))
+            df2['city'] = city
+            df2['snapshot'] = snapshot
+            df2['row'] = df2.index
+            store.append(df2)
+    return store.rows
+
+def find_items_files(data_dir, city, category='real-estate'):
+    """
+    Returns {snapshot: items file} of the {city}--{category}--{jalali date} items files of data_dir.
+    """
+    raw_files = {}
+    # a .jsonl file is preferred to a .json file of the same day.
+    for ext in ('json', 'jsonl'):
+        for raw_file in glob.glob(os.path.join(data_dir, '{}--{}--*.{}'.format(city, category, ext))):
+            raw_files[os.path.splitext(os.path.basename(raw_file))[0].split('--')[-1]] = raw_file
+    return raw_files
+
+def ingest_snapshots(data_dir='./data', store_dir='./data/store', cities=None, category='real-estate', chunksize=20000, dedup=False,
+                     price_index_file=None, verbose=True):
+    """
+    Ingests every {city}--{category}--{jalali date} items file of data_dir into {store_dir}/{city}--{category}--{jalali date}.parquet.
+    Files which are already ingested and not changed since are skipped, so it can be run after each crawl.
+    cities: English city names of CITY_NAMES, all of them by default.
+    dedup: a post is kept only in the first snapshot where it is seen, by post_id or content (see drop_duplicate_posts).
+           the index of seen posts is kept in {store_dir}/_{city}--{category}.dedup (readers of the store skip '_' files).
+    price_index_file: a SQLite file of price_index.PriceIndex. stats of each new or changed snapshot are added to it.
+    Returns list of store files.
+    """
+    store_files = []
+    index = price_index.PriceIndex(price_index_file).open() if price_index_file else None
+    try:
+        for city in (cities or CITY_NAMES):
+            raw_files = find_items_files(data_dir, city, category)
+            dedup_index = None
+            if dedup:
+                os.makedirs(store_dir, exist_ok=True)
+                dedup_index = crawl_state.DedupIndex(os.path.join(store_dir, '_{}--{}.dedup'.format(city, category))).open()
+            try:
+                for snapshot, raw_file in sorted(raw_files.items()):
+                    name = '{}--{}--{}'.format(city, category, snapshot)
+                    store_file = os.path.join(store_dir, name + '.parquet')
+                    ingested = False
+                    if not os.path.exists(store_file) or os.path.getmtime(store_file) < os.path.getmtime(raw_file):
+                        rows = ingest_posts(raw_file, CITY_NAMES[city], store_file, chunksize=chunksize, city=city,
+                                            snapshot=snapshot, dedup_index=dedup_index)
+                        ingested = True
+                        if verbose:
+                            print('** {}: {} rows'.format(name, rows))
+                    if index is not None and (ingested or not index.has_snapshot(city, snapshot)):
+                        df_sell, df_rent = split_sell_rent(load_store(store_file).drop(columns=['city', 'snapshot']))
+                        index.add_snapshot(city, snapshot, df_sell, df_rent)
+                    store_files.append(store_file)
+            finally:
+                if dedup_index is not None:
+                    dedup_index.close()
+    finally:
+        if index is not None:
+            index.close()
+    return store_files
+
+def read_store_file(store_file):
+    """
+    Reads a store file of ingest_posts as the select_total result of its items file: same index, columns and dtypes.
+    """
+    df2 = dataset_cache.restore_types(pd.read_parquet(store_file), STORE_COLUMN_TYPES)
+    for col, labels in ORDERED_CATEGORIES.items():
+        df2[col] = pd.Categorical(df2[col], categories=labels, ordered=True)
+    df2 = df2.set_index('row').drop(columns=['city', 'snapshot'])
+    df2.index.name = None
+    return df2
+
+def load_store(store_path, cities=None, snapshots=None, columns=None):
+    """
+    Reads ingested posts from a store file or directory, like df_total of prepare_datasets.
+    cities, snapshots: lists to select; only the matching row groups are read.
+    location and sub_category are categorical, area_cat and age_cat are ordered like pd.cut results.
+    """
+    filters = []
+    if cities is not None:
+        filters.append(('city', 'in', list(cities)))
+    if snapshots is not None:
+        filters.append(('snapshot', 'in', list(snapshots)))
+    df2 = dataset_cache.restore_types(pd.read_parquet(store_path, columns=columns, filters=filters or None), STORE_COLUMN_TYPES)
+    for col, labels in ORDERED_CATEGORIES.items():
+        if col in df2.columns:
+            df2[col] = pd.Categorical(df2[col], categories=labels, ordered=True)
+    return dataset_cache.to_categorical(df2, columns=('location', 'sub_category'))
+
+def drop_unused_categories(data, columns=('location', 'sub_category')):
+    """
+    Subsets of categorical datasets keep all categories of the whole dataset, which would be drawn as empty groups.
+    """
+    trimmed = {col: data[col].cat.remove_unused_categories() for col in columns
+               if col in data.columns and isinstance(data[col].dtype, pd.CategoricalDtype)}
+    return data.assign(**trimmed) if trimmed else data
+
+def chart_cube(data, price_column=None, max_price=np.inf):
+    """
+    Returns the StatsCube which overall_charts, sell_charts or rent_charts draw.
+    price_column: 'sell_unit_price' for sell_charts, 'rent_unit_price' for rent_charts. rows priced above max_price
+    are left out of the heatmap and the point cloud, which keeps a stratified sample of at most SWARM_MAX_POINTS rows.
+    """
+    data = drop_unused_categories(data)
+    if price_column is None:
+        return stats_cube.StatsCube.from_frame(data)
+    return stats_cube.StatsCube.from_frame(data, limits={price_column: max_price}, point_columns=['area_cat', 'rooms', price_column],
+                                           max_points=SWARM_MAX_POINTS,
+                                           sample=lambda rows, n: stratified_sample(rows, by=['area_cat', 'rooms'], n=n))
+
+def overall_charts(data, title, chart_file, cube=None):
+    """
+    cube: chart_cube of data, e.g. a saved one. data is not used if it is given.
+    """
+    if cube is None:
+        cube = chart_cube(data)
     plt.figure(figsize=(20,25))
     the_grid = GridSpec(nrows=3, ncols=2, hspace=0.50, wspace=0.2)
 
-    df_agg = data[['ad_type', 'sub_category']].groupby(by=['ad_type']).count()
-    df_agg = df_agg.reset_index()
-    df_agg['ad_type'] = df_agg['ad_type'].apply(lambda x: PersianText.reshape(x))
-    df_agg.columns = [PersianText.reshape(c) for c in list(df_agg.columns)]
-    df_agg = df_agg.fillna(0)
+    # non-null values of the other column, like data[['ad_type', 'sub_category']].groupby(by=['ad_type']).count().
+    counts = cube.counts(['ad_type'], column='sub_category')
+    labels = PersianText.reshape_many(counts.index)
     plt.subplot(the_grid[0, 1])
-    plt.pie(x=df_agg['sub_category'], autopct='%1.1f%%', pctdistance=0.5,
-            shadow=True, textprops={'fontproperties':get_font_properties(20)}, labels=df_agg['ad_type'])
+    plt.pie(x=counts.to_numpy(), autopct='%1.1f%%', pctdistance=0.5,
+            shadow=True, textprops={'fontproperties':get_font_properties(20)}, labels=labels)
     plt.title(PersianText.reshape('نسبت فروش و اجاره'), fontproperties=get_font_properties(20))
-    plt.legend(list(df_agg['ad_type']), prop=get_font_properties(15))
+    plt.legend(labels, prop=get_font_properties(15))
 
-    df_agg = data[['ad_type', 'sub_category']].groupby(by=['sub_category']).count()
-    df_agg = df_agg.reset_index()
-    df_agg['sub_category'] = df_agg['sub_category'].apply(lambda x: PersianText.reshape(x))
-    df_agg.columns = [PersianText.reshape(c) for c in list(df_agg.columns)]
-    df_agg = df_agg.fillna(0)
+    counts = cube.counts(['sub_category'], column='ad_type')
+    labels = PersianText.reshape_many(counts.index)
     plt.subplot(the_grid[0, 0])
-    plt.pie(x=df_agg['ad_type'], autopct='%1.1f%%', pctdistance=0.5,
-            shadow=True, textprops={'fontproperties':get_font_properties(13)}, labels=df_agg['sub_category'])
+    plt.pie(x=counts.to_numpy(), autopct='%1.1f%%', pctdistance=0.5,
+            shadow=True, textprops={'fontproperties':get_font_properties(13)}, labels=labels)
     plt.title(PersianText.reshape('نسبت املاک در دسته‌بندی‌ها'), fontproperties=get_font_properties(20))
-    plt.legend(list(df_agg['sub_category']), prop=get_font_properties(10), loc='upper left')
+    plt.legend(labels, prop=get_font_properties(10), loc='upper left')
 
-    stacked_bar(stacked_group='ad_type', x='sub_category', data=data, title='تعداد فروش و اجاره در دسته‌بندی‌ها', grid_cell=the_grid[1, 1])
-    stacked_bar(stacked_group='ad_type', x='area_cat', data=data, title='تعداد فروش و اجاره برحسب متراژ', grid_cell=the_grid[1, 0])
-    stacked_bar(stacked_group='ad_type', x='location', data=data, title='تعداد فروش و اجاره در محل‌ها', grid_cell=the_grid[2, 0:])
+    stacked_bar(stacked_group='ad_type', x='sub_category', data=None, counts=cube.counts(['ad_type', 'sub_category'], column='location', full=True),
+                title='تعداد فروش و اجاره در دسته‌بندی‌ها', grid_cell=the_grid[1, 1])
+    stacked_bar(stacked_group='ad_type', x='area_cat', data=None, counts=cube.counts(['ad_type', 'area_cat'], column='location', full=True),
+                title='تعداد فروش و اجاره برحسب متراژ', grid_cell=the_grid[1, 0])
+    stacked_bar(stacked_group='ad_type', x='location', data=None, counts=cube.counts(['ad_type', 'location'], column='sub_category', full=True),
+                title='تعداد فروش و اجاره در محل‌ها', grid_cell=the_grid[2, 0:])
 
     plt.suptitle(PersianText.reshape(title), fontproperties=get_font_properties(40))
     plt.savefig(chart_file)
+    plt.close()
     return
 
-def sell_charts(data, title, chart_file, max_unit_price=np.inf):
+def sell_charts(data, title, chart_file, max_unit_price=np.inf, cube=None):
+    """
+    cube: chart_cube(data, 'sell_unit_price', max_unit_price), e.g. a saved one. data and max_unit_price are not used if it is given.
+    """
+    if cube is None:
+        cube = chart_cube(data, 'sell_unit_price', max_unit_price)
     plt.figure(figsize=(20,35))
     the_grid = GridSpec(nrows=5, ncols=3, hspace=0.60, wspace=0.20)
 
-    count_bar(values=data['area_cat'], grid_cell=the_grid[0, 2],
+    count_bar(values=None, counts=cube.counts(['area_cat'], full=True), grid_cell=the_grid[0, 2],
             title='تعداد بر حسب متراژ', xlabel='متراژ', ylabel='تعداد')
-    mean_bar(x='area_cat', y='sell_unit_price', data=data, grid_cell=the_grid[0, 1],
+    mean_bar(x='area_cat', y='sell_unit_price', data=None, means=cube.means('sell_unit_price', ['area_cat'], full=True), grid_cell=the_grid[0, 1],
             title='میانگین قیمت بر حسب متراژ', xlabel='متراژ', ylabel='میانگین (۱۰ میلیون تومان)')
-    mean_bar(x='area_cat', y='age', data=data, grid_cell=the_grid[0, 0],
+    mean_bar(x='area_cat', y='age', data=None, means=cube.means('age', ['area_cat'], full=True), grid_cell=the_grid[0, 0],
             title='میانگین سن بر حسب متراژ', xlabel='متراژ', ylabel='میانگین (سال)')
 
-    count_bar(values=data['age_cat'], grid_cell=the_grid[1, 2],
+    count_bar(values=None, counts=cube.counts(['age_cat'], full=True), grid_cell=the_grid[1, 2],
             title='تعداد بر حسب سن', xlabel='سن بنا', ylabel='تعداد')
-    mean_bar(x='age_cat', y='sell_unit_price', data=data, grid_cell=the_grid[1, 1],
+    mean_bar(x='age_cat', y='sell_unit_price', data=None, means=cube.means('sell_unit_price', ['age_cat'], full=True), grid_cell=the_grid[1, 1],
             title='میانگین قیمت بر حسب سن', xlabel='سن بنا', ylabel='میانگین (۱۰ میلیون تومان)')
-    mean_bar(x='age_cat', y='area', data=data, grid_cell=the_grid[1, 0],
+    mean_bar(x='age_cat', y='area', data=None, means=cube.means('area', ['age_cat'], full=True), grid_cell=the_grid[1, 0],
             title='میانگین متراژ بر حسب سن', xlabel='سن بنا', ylabel='میانگین (مترمربع)')
 
-    count_bar(values=data['sell_unit_price_cat'], grid_cell=the_grid[2, 2],
+    count_bar(values=None, counts=cube.counts(['sell_unit_price_cat'], full=True), grid_cell=the_grid[2, 2],
             title='تعداد بر حسب قیمت', xlabel='قیمت هر متر', ylabel='تعداد')
-    mean_bar(x='sell_unit_price_cat', y='age', data=data, grid_cell=the_grid[2, 1],
+    mean_bar(x='sell_unit_price_cat', y='age', data=None, means=cube.means('age', ['sell_unit_price_cat'], full=True), grid_cell=the_grid[2, 1],
             title='میانگین سن بر حسب قیمت', xlabel='قیمت هر متر', ylabel='میانگین (سال)')
-    mean_bar(x='sell_unit_price_cat', y='area', data=data, grid_cell=the_grid[2, 0],
+    mean_bar(x='sell_unit_price_cat', y='area', data=None, means=cube.means('area', ['sell_unit_price_cat'], full=True), grid_cell=the_grid[2, 0],
             title='میانگین متراژ بر حسب قیمت', xlabel='قیمت هر متر', ylabel='میانگین (مترمربع)')
 
-    df_temp = data[data['sell_unit_price'] <= max_unit_price]
-    df_agg = df_temp[['location', 'age_cat', 'sell_unit_price']]
-    df_agg = df_agg.groupby(by=['age_cat', 'location']).mean()
-    df_agg = df_agg.unstack()
-    df_agg.columns = df_agg.columns.get_level_values(1)
+    df_agg = cube.means('sell_unit_price', ['age_cat', 'location'], where={stats_cube.IN_RANGE: True}, full=True).unstack()
     heatmap(data=df_agg, title='میانگین قیمت هر متر به نسبت محل و سن', xlabel='محل', ylabel='سن (سال)', cbar_label='۱۰ میلیون', grid_cell=the_grid[3, 0:])
 
-    df_temp = data[data['sell_unit_price'] <= max_unit_price]
-    swarm(x='area_cat', y='sell_unit_price', hue='rooms', data=df_temp, grid_cell=the_grid[4, 0:],
+    swarm(x='area_cat', y='sell_unit_price', hue='rooms', data=cube.points, sampled=cube.points_sampled, grid_cell=the_grid[4, 0:],
         title='تعداد برحسب متراژ، قیمت و تعداد اتاق', xlabel='متراژ', ylabel='قیمت هر متر (۱۰ میلیون تومان)',
         legend_title='تعداد اتاق')
 
     plt.suptitle(PersianText.reshape(title), fontproperties=get_font_properties(40))
     plt.savefig(chart_file)
+    plt.close()
     return
 
-def rent_charts(data, title, chart_file, max_unit_rent=np.inf):
+def rent_charts(data, title, chart_file, max_unit_rent=np.inf, cube=None):
+    """
+    cube: chart_cube(data, 'rent_unit_price', max_unit_rent), e.g. a saved one. data and max_unit_rent are not used if it is given.
+    """
+    if cube is None:
+        cube = chart_cube(data, 'rent_unit_price', max_unit_rent)
     plt.figure(figsize=(20,35))
     the_grid = GridSpec(nrows=5, ncols=3, hspace=0.50, wspace=0.3)
 
-    count_bar(values=data['area_cat'], grid_cell=the_grid[0, 2],
+    count_bar(values=None, counts=cube.counts(['area_cat'], full=True), grid_cell=the_grid[0, 2],
             title='تعداد بر حسب متراژ', xlabel='متراژ', ylabel='تعداد')
-    mean_bar(x='area_cat', y='rent_unit_price', data=data, grid_cell=the_grid[0, 1],
+    mean_bar(x='area_cat', y='rent_unit_price', data=None, means=cube.means('rent_unit_price', ['area_cat'], full=True), grid_cell=the_grid[0, 1],
             title='میانگین اجاره بر حسب متراژ', xlabel='متراژ', ylabel='میانگین')
-    mean_bar(x='area_cat', y='age', data=data, grid_cell=the_grid[0, 0],
+    mean_bar(x='area_cat', y='age', data=None, means=cube.means('age', ['area_cat'], full=True), grid_cell=the_grid[0, 0],
             title='میانگین سن بر حسب متراژ', xlabel='متراژ', ylabel='میانگین (سال)')
 
-    count_bar(values=data['age_cat'], grid_cell=the_grid[1, 2],
+    count_bar(values=None, counts=cube.counts(['age_cat'], full=True), grid_cell=the_grid[1, 2],
             title='تعداد بر حسب سن', xlabel='سن بنا', ylabel='تعداد')
-    mean_bar(x='age_cat', y='rent_unit_price', data=data, grid_cell=the_grid[1, 1],
+    mean_bar(x='age_cat', y='rent_unit_price', data=None, means=cube.means('rent_unit_price', ['age_cat'], full=True), grid_cell=the_grid[1, 1],
             title='میانگین اجاره بر حسب سن', xlabel='سن بنا', ylabel='میانگین')
-    mean_bar(x='age_cat', y='area', data=data, grid_cell=the_grid[1, 0],
+    mean_bar(x='age_cat', y='area', data=None, means=cube.means('area', ['age_cat'], full=True), grid_cell=the_grid[1, 0],
             title='میانگین متراژ بر حسب سن', xlabel='سن بنا', ylabel='میانگین (مترمربع)')
 
-    count_bar(values=data['rent_unit_price_cat'], grid_cell=the_grid[2, 2],
+    count_bar(values=None, counts=cube.counts(['rent_unit_price_cat'], full=True), grid_cell=the_grid[2, 2],
             title='تعداد بر حسب اجاره', xlabel='اجاره به ازای هر متر', ylabel='تعداد')
-    mean_bar(x='rent_unit_price_cat', y='age', data=data, grid_cell=the_grid[2, 1],
+    mean_bar(x='rent_unit_price_cat', y='age', data=None, means=cube.means('age', ['rent_unit_price_cat'], full=True), grid_cell=the_grid[2, 1],
             title='میانگین سن بر حسب اجاره', xlabel='اجاره به ازای هر متر', ylabel='میانگین (سال)')
-    mean_bar(x='rent_unit_price_cat', y='area', data=data, grid_cell=the_grid[2, 0],
+    mean_bar(x='rent_unit_price_cat', y='area', data=None, means=cube.means('area', ['rent_unit_price_cat'], full=True), grid_cell=the_grid[2, 0],
             title='میانگین متراژ بر حسب اجاره', xlabel='اجاره به ازای هر متر', ylabel='میانگین (مترمربع)')
 
-    df_temp = data[data['rent_unit_price'] <= max_unit_rent]
-    df_agg = df_temp[['location', 'age_cat', 'rent_unit_price']]
-    df_agg = df_agg.groupby(by=['age_cat', 'location']).mean()
-    df_agg = df_agg.unstack()
-    df_agg.columns = df_agg.columns.get_level_values(1)
+    df_agg = cube.means('rent_unit_price', ['age_cat', 'location'], where={stats_cube.IN_RANGE: True}, full=True).unstack()
     heatmap(data=df_agg, title='میانگین اجاره هر متر به نسبت محل و سن', xlabel='محل', ylabel='سن (سال)', cbar_label='', grid_cell=the_grid[3, 0:])
 
-    df_temp = data[data['rent_unit_price'] <= max_unit_rent]
-    swarm(x='area_cat', y='rent_unit_price', hue='rooms', data=df_temp, grid_cell=the_grid[4, 0:],
+    swarm(x='area_cat', y='rent_unit_price', hue='rooms', data=cube.points, sampled=cube.points_sampled, grid_cell=the_grid[4, 0:],
         title='تعداد برحسب متراژ، اجاره و تعداد اتاق', xlabel='متراژ', ylabel='اجاره به ازای هر متر',
         legend_title='تعداد اتاق')
 
     plt.suptitle(PersianText.reshape(title), fontproperties=get_font_properties(40))
     plt.savefig(chart_file)
+    plt.close()
+    return
+
+def trend_chart(index, city, measure, title, chart_file, locations=None, sub_category=price_index.ALL, stat='median',
+                band=('p25', 'p75'), start=None, end=None, max_locations=8):
+    """
+    Draws `stat` of a measure of price_index over time, one line per location, with the band quantiles of the
+    whole city shaded. index: an open price_index.PriceIndex.
+    locations: locations to draw, the max_locations ones with most posts by default.
+    """
+    if locations is None:
+        locations = index.locations(city, measure, sub_category)[:max_locations]
+    plt.figure(figsize=(20, 10))
+    ax = plt.gca()
+    city_trend = index.trend(city, measure, sub_category=sub_category, start=start, end=end)
+    if band and len(city_trend):
+        ax.fill_between(city_trend['date'], city_trend[band[0]], city_trend[band[1]], color='lightgray', alpha=0.5)
+    ax.plot(city_trend['date'], city_trend[stat], color='black', linewidth=3, label=PersianText.reshape(CITY_NAMES.get(city, city)))
+    for location in locations:
+        trend = index.trend(city, measure, location=location, sub_category=sub_category, start=start, end=end)
+        ax.plot(trend['date'], trend[stat], marker='o', label=PersianText.reshape(location))
+    ax.legend(prop=get_font_properties(12))
+    ax.set_ylabel(PersianText.reshape(price_index.MEASURES.get(measure, measure)), fontproperties=get_font_properties(14))
+    ax.grid(True, alpha=0.3)
+    plt.title(PersianText.reshape(title), fontproperties=get_font_properties(24))
+    plt.savefig(chart_file)
+    plt.close()
     return
 
 # >>>>>>>>> main <<<<<<<<<<
 if __name__ == "__main__":
-    gd = str(datetime.now().date())
-    jd = jalali.Gregorian(gd).persian_string(date_format='{}{:02d}{:02d}')
-    # jd = '13990324'
-
-    city_name_en = 'isfahan'
-    raw_data = './data/{}--real-estate--{}.json'.format(city_name_en, jd)
-    if os.path.exists(raw_data):
-        print('** Preparing data ...')
-        df_total, df_sell, df_rent = prepare_datasets(raw_data, city_name_fa=CITY_NAMES[city_name_en])
-    else:
-        print('***** ERROR:', raw_data, 'NOT FOUND!')
-        exit(0)
-
-    df_sell_apartment = df_sell[df_sell['sub_category'] == 'آپارتمان']
-    df_sell_house = df_sell[df_sell['sub_category'] == 'خانه و ویلا']
-    df_rent_apartment = df_rent[df_rent['sub_category'] == 'آپارتمان']
-    df_rent_house = df_rent[df_rent['sub_category'] == 'خانه و ویلا']
-
-    print('** Visualizing data ...')
-
-    title = 'نمای کلی آگهی‌های املاک {}'.format(CITY_NAMES[city_name_en])
-    chart_file = './charts/{}--overall-{}.png'.format(city_name_en, jd)
-    overall_charts(df_total, title=title, chart_file=chart_file)
-
-    chart_file = './charts/{}--apartment-sell--{}.png'.format(city_name_en, jd)
-    sell_charts(df_sell_apartment, title='نمای آپارتمان‌های فروشی', chart_file=chart_file, max_unit_price=5e7)
-    chart_file = './charts/{}--apartment-rent--{}.png'.format(city_name_en, jd)
-    rent_charts(df_rent_apartment, title='نمای آپارتمان‌های اجاره‌ای', chart_file=chart_file, max_unit_rent=200000)
-
-    chart_file = './charts/{}--house-sell--{}.png'.format(city_name_en, jd)
-    sell_charts(df_sell_house, title='نمای خانه‌های فروشی', chart_file=chart_file, max_unit_price=5e7)
-    chart_file = './charts/{}--house-rent--{}.png'.format(city_name_en, jd)
-    rent_charts(df_rent_house, title='نمای خانه‌های اجاره‌ای', chart_file=chart_file, max_unit_rent=200000)
+    # charts of each city are rendered in parallel processes, see chart_renderer.py for more options.
+    from chart_renderer import render_city_charts
+    render_city_charts(['isfahan'], processes=5)
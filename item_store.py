@@ -0,0 +1,84 @@
+import json
+import os
+
+class JsonLinesStore:
+    """
+    Append-only store of posts in JSON Lines format (one post per line).
+    Each post is flushed as soon as it is appended, so a crashed run loses at most
+    the post which was being written.
+    """
+    def __init__(self, file_path, fsync=False):
+        self.__file_path__ = file_path
+        self.__fsync__ = fsync
+        self.__fp__ = None
+
+    def open(self):
+        # a crash in the middle of a write may leave a broken last line. new items start on a new line after it.
+        broken_last_line = False
+        if os.path.exists(self.__file_path__) and os.path.getsize(self.__file_path__) > 0:
+            with open(self.__file_path__, 'rb') as fp:
+                fp.seek(-1, os.SEEK_END)
+                broken_last_line = fp.read(1) != b'\n'
+        self.__fp__ = open(self.__file_path__, 'a')
+        if broken_last_line:
+            self.__fp__.write('\n')
+        return self
+
+    def append(self, item):
+        self.__fp__.write(json.dumps(item) + '\n')
+        self.__fp__.flush()
+        if self.__fsync__:
+            os.fsync(self.__fp__.fileno())
+        return
+
+    def close(self):
+        if self.__fp__ is not None:
+            self.__fp__.close()
+            self.__fp__ = None
+        return
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+def is_json_lines(file_path):
+    return file_path.endswith('.jsonl')
+
+def read_items(file_path):
+    """
+    Yields posts of a JSON Lines file one by one.
+    Lines which can not be parsed (e.g. the last line of a crashed run) are skipped.
+    """
+    with open(file_path, 'r') as fp:
+        for line in fp:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def convert_json_to_jsonl(json_file_path, jsonl_file_path):
+    """
+    Converts an items file written by the old browse_and_save_items (a single JSON array)
+    to JSON Lines, so it can be appended to and read without loading the whole array.
+    Returns number of converted posts.
+    """
+    with open(json_file_path, 'r') as fp:
+        posts_items = json.load(fp)
+    with JsonLinesStore(jsonl_file_path) as store:
+        for item in posts_items:
+            store.append(item)
+    return len(posts_items)
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) != 3:
+        print('usage: python item_store.py ITEMS.json ITEMS.jsonl')
+        exit(1)
+    n = convert_json_to_jsonl(sys.argv[1], sys.argv[2])
+    print('** {} posts converted.'.format(n))
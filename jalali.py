@@ -189,4 +189,156 @@ class Persian:
         return date_format.format(self.gregorian_year, self.gregorian_month, self.gregorian_day)
 
     def gregorian_datetime(self):
-        return datetime.date(self.gregorian_year, self.gregorian_month, self.gregorian_day)
\ No newline at end of file
+        return datetime.date(self.gregorian_year, self.gregorian_month, self.gregorian_day)
+
+# Vectorized converters for whole date columns. They give the same dates as Gregorian and Persian,
+# without a Python object per date.
+#
+#  >>> jalali.gregorian_to_persian(['2014-3-31', '2020-06-14'])
+#  (array([1393, 1399]), array([1, 3]), array([11, 25]))
+#  >>> jalali.persian_to_gregorian(np.array([13930111, 13990325]))
+#  (array([2014, 2020]), array([3, 6]), array([31, 14]))
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+__DATE_PATTERN__ = re.compile(r'^(\d{4})\D(\d{1,2})\D(\d{1,2})$')
+__G_A__ = [0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
+__G_MONTH_DAYS__ = [0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+
+def _parse_date(value):
+    # the scalar classes accept these strings and dates. anything else is invalid.
+    if type(value) is str:
+        m = __DATE_PATTERN__.match(value)
+        if m:
+            return int(m.group(1)), int(m.group(2)), int(m.group(3))
+    elif isinstance(value, datetime.date):
+        return value.year, value.month, value.day
+    return 0, 0, 0
+
+
+def _split_dates(dates):
+    """
+    Returns year, month and day int64 arrays of a date column and a mask of parsed dates.
+    dates: one array-like of YYYYMMDD ints, 'YYYY-MM-DD' like strings, dates or datetime64,
+    or three array-likes of years, months and days.
+    """
+    if np is None:
+        raise ImportError('numpy is needed for vectorized date conversion')
+    if len(dates) == 3:
+        year, month, day = [np.asarray(d).astype('int64') for d in dates]
+        return year, month, day, np.ones(year.shape, dtype=bool)
+    if len(dates) != 1:
+        raise Exception("Invalid Input")
+    values = np.asarray(dates[0])
+    if np.issubdtype(values.dtype, np.datetime64):
+        days = values.astype('datetime64[D]')
+        parsed = ~np.isnat(days)
+        days = np.where(parsed, days, np.datetime64('1970-01-01'))
+        months = days.astype('datetime64[M]')
+        year = months.astype('datetime64[Y]').astype('int64') + 1970
+        month = months.astype('int64') % 12 + 1
+        day = (days - months).astype('int64') + 1
+        return year, month, day, parsed
+    if np.issubdtype(values.dtype, np.integer):
+        values = values.astype('int64')
+        return values // 10000, values // 100 % 100, values % 100, np.ones(values.shape, dtype=bool)
+    # strings and dates: a date column repeats the same few crawl days on every row, so each distinct value is parsed once.
+    index = {}
+    codes = np.fromiter((index.setdefault(value, len(index)) for value in values.astype(object).ravel()), dtype='int64', count=values.size)
+    parts = np.array([_parse_date(value) for value in index], dtype='int64').reshape(-1, 3)[codes.reshape(values.shape)]
+    year, month, day = parts[..., 0], parts[..., 1], parts[..., 2]
+    return year, month, day, year != 0
+
+
+def _trunc(values):
+    # int() of the scalar converters rounds toward zero.
+    return np.trunc(values).astype('int64')
+
+
+def _finish(valid, errors, message, *parts):
+    if errors == 'coerce':
+        return tuple(np.where(valid, part, np.nan) for part in parts)
+    if errors != 'raise':
+        raise ValueError("errors must be 'raise' or 'coerce'")
+    if not valid.all():
+        raise Exception(message)
+    return parts
+
+
+def gregorian_to_persian(*dates, errors='raise'):
+    """
+    Returns Persian (year, month, day) int64 arrays of Gregorian dates, like Gregorian(date).persian_tuple() of each date.
+    dates: see _split_dates. pandas Series are accepted as array-likes.
+    errors: 'raise' raises on an invalid date, like Gregorian. 'coerce' returns float64 arrays with NaN for invalid dates.
+    """
+    year, month, day, valid = _split_dates(dates)
+    # the same check as datetime.datetime(year, month, day) of Gregorian.
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    valid = valid & (year >= 1) & (year <= 9999) & (month >= 1) & (month <= 12)
+    month = np.where(valid, month, 1)
+    month_days = np.asarray(__G_MONTH_DAYS__)[month] + ((month == 2) & leap)
+    valid = valid & (day >= 1) & (day <= month_days)
+
+    d_4 = year % 4
+    doy_g = np.asarray(__G_A__)[month] + day + ((d_4 == 0) & (month > 2))
+    d_33 = _trunc(((year - 16) % 132) * .0305)
+    a = np.where((d_33 == 3) | (d_33 < (d_4 - 1)) | (d_4 == 0), 286, 287)
+    b = np.where(((d_33 == 1) | (d_33 == 2)) & ((d_33 == d_4) | (d_4 == 1)), 78,
+                 np.where((d_33 == 3) & (d_4 == 0), 80, 79))
+    shift = _trunc((year - 10) / 63) == 30
+    a = a - shift
+    b = b + shift
+    after_b = doy_g > b
+    jy = np.where(after_b, year - 621, year - 622)
+    doy_j = np.where(after_b, doy_g - b, doy_g + a)
+    first_half = doy_j < 187
+    jm = np.where(first_half, _trunc((doy_j - 1) / 31), _trunc((doy_j - 187) / 30))
+    jd = np.where(first_half, doy_j - 31 * jm, doy_j - 186 - jm * 30)
+    jm = jm + np.where(first_half, 1, 7)
+    return _finish(valid, errors, "Invalid Date", jy, jm, jd)
+
+
+def persian_to_gregorian(*dates, errors='raise'):
+    """
+    Returns Gregorian (year, month, day) int64 arrays of Persian dates, like Persian(date).gregorian_tuple() of each date.
+    dates: see _split_dates; YYYYMMDD ints are Persian dates here, e.g. 13990325.
+    errors: 'raise' raises on an invalid date, like Persian. 'coerce' returns float64 arrays with NaN for invalid dates.
+    """
+    year, month, day, valid = _split_dates(dates)
+    valid = valid & ~((year < 1) | (month < 1) | (month > 12) | (day < 1) | (day > 31) | ((month > 6) & (day == 31)))
+
+    d_4 = (year + 1) % 4
+    doy_j = np.where(month < 7, (month - 1) * 31 + day, (month - 7) * 30 + day + 186)
+    d_33 = _trunc(((year - 55) % 132) * .0305)
+    a = np.where((d_33 != 3) & (d_4 <= d_33), 287, 286)
+    b = np.where(((d_33 == 1) | (d_33 == 2)) & ((d_33 == d_4) | (d_4 == 1)), 78,
+                 np.where((d_33 == 3) & (d_4 == 0), 80, 79))
+    shift = _trunc((year - 19) / 63) == 20
+    a = a - shift
+    b = b + shift
+    in_year = doy_j <= a
+    gy = np.where(in_year, year + 621, year + 622)
+    gd = np.where(in_year, doy_j + b, doy_j - a)
+
+    # the scalar loop stops at the first month whose days are not exceeded, or runs out at month 12.
+    month_days = np.array(__G_MONTH_DAYS__)
+    ends = np.cumsum(month_days)
+    leap_ends = np.cumsum(month_days + (np.arange(13) == 2))
+    ends = np.where((gy % 4 == 0)[..., np.newaxis], leap_ends, ends)
+    passed = (gd[..., np.newaxis] > ends).sum(axis=-1)
+    # days before month k are ends[k - 1]; if all 13 are passed, the loop has subtracted them all.
+    before = np.concatenate([np.zeros(ends.shape[:-1] + (1,), dtype=ends.dtype), ends], axis=-1)
+    gd = gd - np.take_along_axis(before, passed[..., np.newaxis], axis=-1)[..., 0]
+    gm = np.minimum(passed, 12)
+    return _finish(valid, errors, "Incorrect Date", gy, gm, gd)
+
+
+def date_ints(year, month, day):
+    """
+    Returns YYYYMMDD int64 array of year, month and day arrays, e.g. to use them as sortable keys.
+    """
+    return np.asarray(year).astype('int64') * 10000 + np.asarray(month).astype('int64') * 100 + np.asarray(day).astype('int64')
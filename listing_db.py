@@ -0,0 +1,220 @@
+"""
+Prepared datasets of many cities and days in one SQLite file.
+
+    >>> with listing_db.ListingDB('./data/listings.sqlite') as db:
+    ...     db.add_datasets('isfahan', '13990330', charts.prepare_datasets(raw_file, 'اصفهان'))
+    ...     cube = db.chart_cube('sell', 'sell_unit_price', 5e7, cities=['isfahan'], where={'sub_category': 'آپارتمان'})
+    >>> charts.sell_charts(None, title, chart_file, cube=cube)
+
+Charts draw a StatsCube, so the GROUP BY of the cube runs in SQLite and only its cells (and a sample of points)
+are read into memory, whatever the number of rows in the file. Rows are kept in three tables, like the three
+datasets of prepare_datasets, with the city and snapshot (jalali date as YYYYMMDD) of each row.
+"""
+import sqlite3
+import numpy as np
+import pandas as pd
+import divar_realestate_charts as charts
+import stats_cube
+import price_index
+
+DB_VERSION = 1
+
+DATASET_COLUMNS = {
+    'total': ('location', 'sub_category', 'ad_type', 'age', 'rooms', 'area', 'sell_price', 'sell_unit_price', 'mortgage', 'rent',
+              'area_cat', 'age_cat'),
+    'sell': ('location', 'sub_category', 'ad_type', 'age', 'rooms', 'area', 'sell_price', 'sell_unit_price',
+             'area_cat', 'age_cat', 'sell_unit_price_cat'),
+    'rent': ('location', 'sub_category', 'ad_type', 'age', 'rooms', 'area', 'mortgage', 'rent', 'rent_unit_price',
+             'area_cat', 'age_cat', 'rent_unit_price_cat'),
+}
+TEXT_COLUMNS = ('location', 'sub_category', 'ad_type', 'area_cat', 'age_cat', 'sell_unit_price_cat', 'rent_unit_price_cat')
+INDEXED_COLUMNS = ('snapshot', 'location', 'sub_category', 'ad_type')
+ORDERED_CATEGORIES = {'area_cat': charts.AREA_CAT_LABELS, 'age_cat': charts.AGE_CAT_LABELS,
+                      'sell_unit_price_cat': charts.SELL_UNIT_PRICE_CAT_LABELS, 'rent_unit_price_cat': charts.RENT_UNIT_PRICE_CAT_LABELS}
+CATEGORICAL_COLUMNS = ('location', 'sub_category')
+
+def _schema(dataset):
+    table = 'listings_' + dataset
+    columns = ['city TEXT NOT NULL', 'snapshot TEXT NOT NULL'] + \
+              ['{} {}'.format(col, 'TEXT' if col in TEXT_COLUMNS else 'REAL') for col in DATASET_COLUMNS[dataset]]
+    statements = ['CREATE TABLE IF NOT EXISTS {} ({})'.format(table, ', '.join(columns)),
+                  'CREATE INDEX IF NOT EXISTS {0}_city_snapshot ON {0} (city, snapshot)'.format(table)]
+    statements += ['CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({1})'.format(table, col) for col in INDEXED_COLUMNS]
+    return ';\n'.join(statements) + ';\n'
+
+def recast(df):
+    """
+    Converts text columns read from the database to the dtypes of prepare_datasets: area, age and price categories
+    are ordered like pd.cut results, location and sub_category are categorical.
+    """
+    for col, labels in ORDERED_CATEGORIES.items():
+        if col in df.columns:
+            df[col] = pd.Categorical(df[col], categories=labels, ordered=True)
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+def _check_columns(dataset, columns):
+    # column names are put in queries, so only the known ones are accepted.
+    for col in columns:
+        if col not in DATASET_COLUMNS[dataset]:
+            raise ValueError('{} is not a column of the {} dataset'.format(col, dataset))
+    return
+
+class ListingDB:
+    def __init__(self, file_path):
+        self.__file_path__ = file_path
+        self.__db__ = None
+
+    def open(self):
+        self.__db__ = sqlite3.connect(self.__file_path__)
+        version = self.__db__.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, DB_VERSION):
+            self.close()
+            raise ValueError('{} is a listings database of another version'.format(self.__file_path__))
+        self.__db__.executescript(''.join(_schema(dataset) for dataset in DATASET_COLUMNS) +
+                                  'CREATE TABLE IF NOT EXISTS snapshots (city TEXT NOT NULL, snapshot TEXT NOT NULL, '
+                                  'PRIMARY KEY (city, snapshot)) WITHOUT ROWID;\n'
+                                  'PRAGMA user_version = {};'.format(DB_VERSION))
+        return self
+
+    def add_datasets(self, city, snapshot, datasets):
+        """
+        Adds (df_total, df_sell, df_rent) of prepare_datasets as a snapshot of a city, replacing an earlier one.
+        """
+        with self.__db__:
+            for dataset, df in zip(DATASET_COLUMNS, datasets):
+                table = 'listings_' + dataset
+                self.__db__.execute('DELETE FROM {} WHERE city = ? AND snapshot = ?'.format(table), (city, snapshot))
+                df = df[list(DATASET_COLUMNS[dataset])].astype({col: object for col in TEXT_COLUMNS if col in df.columns})
+                df.insert(0, 'snapshot', snapshot)
+                df.insert(0, 'city', city)
+                df.to_sql(table, self.__db__, if_exists='append', index=False, chunksize=10000)
+            self.__db__.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?)', (city, snapshot))
+        return
+
+    def add_items_files(self, data_dir='./data', cities=None, category='real-estate', chunksize=None, verbose=True):
+        """
+        Adds the datasets of every {city}--{category}--{jalali date} items file of data_dir which is not in the database yet.
+        chunksize: see charts.prepare_datasets. Returns list of (city, snapshot) added.
+        """
+        added = []
+        for city in (cities or charts.CITY_NAMES):
+            for snapshot, raw_file in sorted(charts.find_items_files(data_dir, city, category).items()):
+                if self.has_snapshot(city, snapshot):
+                    continue
+                datasets = charts.prepare_datasets(raw_file, charts.CITY_NAMES[city], chunksize=chunksize)
+                self.add_datasets(city, snapshot, datasets)
+                added.append((city, snapshot))
+                if verbose:
+                    print('** {} {}: {} rows'.format(city, snapshot, len(datasets[0])))
+        return added
+
+    def snapshots(self, city):
+        return price_index.ingested_snapshots(self.__db__, city)
+
+    def has_snapshot(self, city, snapshot):
+        return price_index.is_ingested(self.__db__, city, snapshot)
+
+    def _where(self, dataset, cities=None, snapshots=None, start=None, end=None, where=None):
+        """
+        Returns the WHERE clause and its parameters of a selection of rows.
+        where: {column: value} of other columns, e.g. {'sub_category': 'آپارتمان'}.
+        """
+        conditions, params = [], []
+        for col, values in (('city', cities), ('snapshot', snapshots)):
+            if values is not None:
+                values = [str(value) for value in values]
+                conditions.append('{} IN ({})'.format(col, ', '.join('?' * len(values))))
+                params.extend(values)
+        if start is not None:
+            conditions.append('snapshot >= ?')
+            params.append(str(start))
+        if end is not None:
+            conditions.append('snapshot <= ?')
+            params.append(str(end))
+        _check_columns(dataset, where or {})
+        for col, value in (where or {}).items():
+            conditions.append('{} = ?'.format(col))
+            params.append(value)
+        return (' WHERE ' + ' AND '.join(conditions)) if conditions else '', params
+
+    def frame(self, dataset, columns=None, cities=None, snapshots=None, start=None, end=None, where=None):
+        """
+        Returns rows of a dataset ('total', 'sell' or 'rent') like the datasets of prepare_datasets, with city and snapshot columns.
+        cities, snapshots: lists to select. start, end: first and last snapshots.
+        """
+        columns = list(columns or DATASET_COLUMNS[dataset])
+        _check_columns(dataset, columns)
+        columns = ['city', 'snapshot'] + columns
+        clause, params = self._where(dataset, cities, snapshots, start, end, where)
+        query = 'SELECT {} FROM listings_{}{}'.format(', '.join(columns), dataset, clause)
+        return recast(pd.read_sql_query(query, self.__db__, params=params))
+
+    def cube(self, dataset, limits=None, point_columns=None, max_points=None, stratify=None, seed=0,
+             cities=None, snapshots=None, start=None, end=None, where=None):
+        """
+        Returns the StatsCube of selected rows of a dataset, like StatsCube.from_frame of them, computed by SQLite.
+        limits, point_columns, max_points: see StatsCube.from_frame.
+        stratify: columns of point groups, which are sampled in proportion to their size, like charts.stratified_sample.
+        """
+        limits = limits or {}
+        _check_columns(dataset, list(limits) + list(point_columns or []) + list(stratify or []))
+        dims = [col for col in stats_cube.DIMENSIONS if col in DATASET_COLUMNS[dataset]]
+        measures = [col for col in stats_cube.MEASURES if col in DATASET_COLUMNS[dataset]]
+        clause, params = self._where(dataset, cities, snapshots, start, end, where)
+        in_range = ' AND '.join('COALESCE({} <= ?, 0)'.format(col) for col in limits) or '1'
+        in_range_params = [float(max_value) for max_value in limits.values()]
+
+        aggregates = ['TOTAL({0}) AS {0}_sum, COUNT({0}) AS {0}_count'.format(col) for col in measures] + ['COUNT(*) AS size']
+        query = 'SELECT {}, ({}) AS {}, {} FROM listings_{}{} GROUP BY {}'.format(
+                ', '.join(dims), in_range, stats_cube.IN_RANGE, ', '.join(aggregates), dataset, clause,
+                ', '.join(dims + [stats_cube.IN_RANGE]))
+        cells = recast(pd.read_sql_query(query, self.__db__, params=in_range_params + params))
+        cells[stats_cube.IN_RANGE] = cells[stats_cube.IN_RANGE].astype(bool)
+        cells = cells.astype({col + '_sum': 'float64' for col in measures})
+        categories = {col: cells[col].dtype for col in dims if isinstance(cells[col].dtype, pd.CategoricalDtype)}
+
+        points, points_sampled = None, False
+        if point_columns:
+            points_clause = clause + (' AND ' if clause else ' WHERE ') + in_range
+            points_params = params + in_range_params
+            count = int(cells.loc[cells[stats_cube.IN_RANGE], 'size'].sum())
+            columns = ', '.join(point_columns)
+            if max_points is None or count <= max_points:
+                query = 'SELECT {} FROM listings_{}{} ORDER BY rowid'.format(columns, dataset, points_clause)
+            else:
+                # each group keeps its first rows in a seeded order of rowids, at least one of them.
+                partition = 'PARTITION BY {}'.format(', '.join(stratify)) if stratify else ''
+                query = ('SELECT {0} FROM (SELECT rowid, {0}, '
+                         'ROW_NUMBER() OVER ({1} ORDER BY (rowid * 2654435761 + ?) % 4294967296) AS n, '
+                         'COUNT(*) OVER ({1}) AS size FROM listings_{2}{3}) '
+                         'WHERE n <= MAX(1, ROUND(size * ? / ?)) ORDER BY rowid').format(columns, partition, dataset, points_clause)
+                points_params = [seed] + points_params + [float(max_points), count]
+                points_sampled = True
+            points = recast(pd.read_sql_query(query, self.__db__, params=points_params))
+        return stats_cube.StatsCube(cells, categories, limits, points, points_sampled)
+
+    def chart_cube(self, dataset, price_column=None, max_price=np.inf, **selection):
+        """
+        Returns the cube which overall_charts ('total' dataset), sell_charts or rent_charts draw, like charts.chart_cube.
+        selection: cities, snapshots, start, end and where of the rows.
+        """
+        if price_column is None:
+            return self.cube(dataset, **selection)
+        return self.cube(dataset, limits={price_column: max_price}, point_columns=['area_cat', 'rooms', price_column],
+                         max_points=charts.SWARM_MAX_POINTS, stratify=['area_cat', 'rooms'], **selection)
+
+    def close(self):
+        if self.__db__ is not None:
+            self.__db__.close()
+            self.__db__ = None
+        return
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -7,6 +7,13 @@ import matplotlib.pyplot as plt
 import matplotlib.font_manager as fm
 import squarify
 import random
+import time
+import functools
+import threading
+import multiprocessing
+import heapq
+import itertools
+from collections import Counter
 from PIL import ImageFont
 from nltk import word_tokenize, FreqDist
 from bidi.algorithm import get_display
@@ -15,6 +22,122 @@ from hazm import POSTagger
 from six import text_type
 # from wordcloud_generator import WCGenerator
 
+__RESHAPER_CONFIG__ = {'language': 'Farsi', 'RIAL SIGN': True}
+__RESHAPER__ = None
+# chart labels are the same few hundred strings (locations, categories, titles) over and over.
+RESHAPE_CACHE_SIZE = 4096
+
+def get_reshaper():
+    global __RESHAPER__
+    if __RESHAPER__ is None:
+        __RESHAPER__ = ArabicReshaper(__RESHAPER_CONFIG__)
+    return __RESHAPER__
+
+@functools.lru_cache(maxsize=RESHAPE_CACHE_SIZE)
+def _reshape_cached(text):
+    return get_display(get_reshaper().reshape(text))
+
+__POS_MODEL__ = 'resources/postagger.model'
+__POS_TAGGERS__ = {}
+__POS_TAGGERS_LOCK__ = threading.Lock()
+# seconds spent by POS tagging in this process. last_* are of the latest tag_sents call.
+POS_TAGGER_TIMINGS = {'load_seconds': 0.0, 'tag_seconds': 0.0, 'calls': 0, 'tokens': 0, 'last_seconds': 0.0, 'last_tokens': 0}
+
+def get_pos_tagger(model=__POS_MODEL__):
+    """
+    Returns hazm POSTagger of a model file. The model is loaded from disk once per process, on first use.
+    """
+    with __POS_TAGGERS_LOCK__:
+        tagger = __POS_TAGGERS__.get(model)
+        if tagger is None:
+            start = time.perf_counter()
+            tagger = POSTagger(model=model)
+            POS_TAGGER_TIMINGS['load_seconds'] += time.perf_counter() - start
+            __POS_TAGGERS__[model] = tagger
+    return tagger
+
+def tag_sents(token_lists, model=__POS_MODEL__):
+    """
+    Tags many documents (lists of tokens) in one call of the tagger. Returns list of [(token, tag), ...] of each document.
+    """
+    token_lists = [list(tokens) for tokens in token_lists]
+    tagger = get_pos_tagger(model)
+    start = time.perf_counter()
+    tagged = tagger.tag_sents(token_lists)
+    seconds = time.perf_counter() - start
+    tokens = sum(len(tokens) for tokens in token_lists)
+    POS_TAGGER_TIMINGS.update(tag_seconds=POS_TAGGER_TIMINGS['tag_seconds'] + seconds, calls=POS_TAGGER_TIMINGS['calls'] + 1,
+                              tokens=POS_TAGGER_TIMINGS['tokens'] + tokens, last_seconds=seconds, last_tokens=tokens)
+    return tagged
+
+# NOTE: there is a problem in filtering english words! any word with at least one english character is recognized as english!
+__LATIN__ = re.compile('[a-zA-Z]')
+
+class TokenFilter:
+    """
+    The filters of PersianText.filter_tokens, prepared once and applied to tokens in one pass.
+    Arguments are those of PersianText.filter_tokens.
+
+        token_filter = TokenFilter(stop_words=[stop_words], language='fa', min_len=2)
+        tokens = token_filter(tokens)
+    """
+    def __init__(self, pos_tags=None, stop_words=None, include_words=None, min_len=1, max_len=100, language=None):
+        # merge all lists in one set
+        self.include_words = frozenset(w for words in include_words for w in words) if include_words is not None else None
+        self.stop_words = frozenset(w for words in stop_words for w in words) if stop_words is not None else frozenset()
+        self.min_len = min_len
+        self.max_len = max_len
+        self.language = language.lower() if language is not None else None
+        self.pos_tags = frozenset(pos_tags) if pos_tags is not None else None
+
+    def accepts(self, token):
+        if not self.min_len <= len(token) <= self.max_len:
+            return False
+        if self.include_words is not None and token not in self.include_words:
+            return False
+        if token in self.stop_words:
+            return False
+        if self.language == 'fa':
+            return __LATIN__.search(token) is None
+        if self.language == 'en':
+            return __LATIN__.search(token) is not None
+        return True
+
+    def __call__(self, tokens):
+        return self.filter_many([tokens])[0]
+
+    def filter_many(self, token_lists):
+        """
+        Filters many token lists. POS tags of all of them are found in one tag_sents call.
+        """
+        accepts = self.accepts
+        filtered = [[t for t in tokens if accepts(t)] for tokens in token_lists]
+        if self.pos_tags is not None:
+            pos_tags = self.pos_tags
+            filtered = [[w for (w, t) in tag_words if t in pos_tags] for tag_words in tag_sents(filtered)]
+        return filtered
+
+def _filter_chunk(task):
+    token_filter, texts = task
+    return token_filter.filter_many([word_tokenize(t) if isinstance(t, str) else t for t in texts])
+
+def filter_many(texts, token_filter, processes=1, chunksize=500):
+    """
+    Returns filtered tokens of many documents, tokenized and filtered in this process or by a pool of processes.
+    texts: list of documents; a document is a text or a list of its tokens.
+    processes: number of processes; 1 (the default) filters in this process, None is os.cpu_count().
+    A pool pays off only if the processes tokenize texts or POS tag them (token_filter has pos_tags, and each
+    process loads the tagger once). Filtering token lists alone is faster in one process, since sending the
+    lists to other processes costs more than filtering them.
+    """
+    chunks = [(token_filter, texts[i:i + chunksize]) for i in range(0, len(texts), chunksize)]
+    if processes == 1 or len(chunks) <= 1:
+        results = [_filter_chunk(chunk) for chunk in chunks]
+    else:
+        with multiprocessing.Pool(processes=processes) as pool:
+            results = pool.map(_filter_chunk, chunks)
+    return [tokens for result in results for tokens in result]
+
 class PersianText:
     def __init__(self, text):
         self.__raw_text__ = text
@@ -37,68 +160,76 @@ class PersianText:
             self.__filtered_tokens__ = self.__all_tokens__.copy()
         return self
 
-    def filter_tokens(self, pos_tags=None, stop_words=None, include_words=None, min_len=1, max_len=100, language=None, reshape=False):
+    def filter_tokens(self, pos_tags=None, stop_words=None, include_words=None, min_len=1, max_len=100, language=None, reshape=False, token_filter=None):
         """
         pos_tags: is a list of tag symbols that should be kept in __tokens__ list.
         tag symbols is based on return value of hazm.POSTagger. for example 'N' means word is a Noun.
         stop_words: is a list of lists of words that should be removed from tokens.
         include_words: is a list of lists of words that tokens should be one of them.
         language: 'fa' for farsi and 'en' for english.
+        token_filter: a TokenFilter, e.g. made once for many texts. the other filter arguments are not used if it is given.
         """
         if self.__all_tokens__ is None:
             self.__all_tokens__ = word_tokenize(self.__result_text__)
             self.__filtered_tokens__ = self.__all_tokens__.copy()
-        self.__filtered_tokens__ = [t for t in self.__all_tokens__ if len(t) >= min_len and len(t) <= max_len]
-
-        if include_words is not None:
-            # merge all lists in one list
-            all_include_words = set([w for words in include_words for w in words])
-            self.__filtered_tokens__ = [t for t in self.__filtered_tokens__ if t in all_include_words]
-
-        if stop_words is not None:
-            # merge all lists in one list
-            all_stop_words = set([w for words in stop_words for w in words])
-            self.__filtered_tokens__ = [t for t in self.__filtered_tokens__ if t not in all_stop_words]
-
-        # NOTE: there is a problem in filtering english words! any word with at least one english character is recognized as english!
-        if language is not None:
-            if language.lower() == 'fa':
-                self.__filtered_tokens__ = [t for t in self.__filtered_tokens__ if re.search('[a-zA-Z]', t) is None]
-            elif language.lower() == 'en':
-                self.__filtered_tokens__ = [t for t in self.__filtered_tokens__ if re.search('[a-zA-Z]', t) is not None]
-        if pos_tags is not None:
-            tagger = POSTagger(model='resources/postagger.model')
-            tag_words = tagger.tag(self.__filtered_tokens__)
-            self.__filtered_tokens__ = [w for (w, t) in tag_words if t in pos_tags]
+        if token_filter is None:
+            token_filter = TokenFilter(pos_tags=pos_tags, stop_words=stop_words, include_words=include_words,
+                                       min_len=min_len, max_len=max_len, language=language)
+        self.__filtered_tokens__ = token_filter(self.__all_tokens__)
 
         if reshape == True:
             self.reshape_filtered_tokens()
         return self
 
+    @staticmethod
+    def filter_pos_tags(texts, pos_tags, model=__POS_MODEL__):
+        """
+        Keeps tokens whose tag is in pos_tags, like filter_tokens(pos_tags=...), for many PersianText objects at once.
+        Tokens of all texts are tagged in one tag_sents call. texts: PersianText objects after filter_tokens.
+        """
+        texts = list(texts)
+        for text in texts:
+            if text.__filtered_tokens__ is None:
+                text.filter_tokens()
+        pos_tags = set(pos_tags)
+        for text, tag_words in zip(texts, tag_sents([text.__filtered_tokens__ for text in texts], model=model)):
+            text.__filtered_tokens__ = [w for (w, t) in tag_words if t in pos_tags]
+        return texts
+
     def reshape_filtered_tokens(self):
-        reshaper_config = {'language': 'Farsi', 'RIAL SIGN': True}
-        reshaper = ArabicReshaper(reshaper_config)
-        # reshaped_tokens = [get_display(reshaper.reshape(t)) for t in self.__all_tokens__]
-        reshaped_tokens = [reshaper.reshape(t) for t in self.__filtered_tokens__]
-        self.__filtered_tokens__ = []
-        for x in reshaped_tokens:
+        reshaped_tokens = []
+        for t in self.__filtered_tokens__:
             # an exception is raised if get_display can not handle some special characters in token.
             try:
-                dx = get_display(x)
-                self.__filtered_tokens__.append(dx)
+                reshaped_tokens.append(_reshape_cached(t))
             except AssertionError:
                 continue
+        self.__filtered_tokens__ = reshaped_tokens
         return
 
     @staticmethod
     def reshape(text):
-        reshaper_config = {'language': 'Farsi', 'RIAL SIGN': True}
-        reshaper = ArabicReshaper(reshaper_config)
+        """
+        Reshaped texts are cached, so reshaping the same label again is a dict lookup.
+        """
         try:
-            return get_display(reshaper.reshape(text))
+            return _reshape_cached(text)
+        except TypeError:
+            # unhashable text can not be cached.
+            try:
+                return get_display(get_reshaper().reshape(text))
+            except:
+                return None
         except:
             return None
 
+    @staticmethod
+    def reshape_many(texts):
+        """
+        Returns list of reshaped texts, e.g. of tick labels or column names.
+        """
+        return [PersianText.reshape(text) for text in texts]
+
     def generate_wordcloud(self, font_path=None, mask=None, background_color='black', repeat=False, scale=1,
                            min_font_size=4, max_font_size=None, max_words=200,
                            colormap=None, contour_width=0, contour_color='black', color_func=None,
@@ -138,7 +269,7 @@ class PersianText:
             width_inch, height_inch: width and height of the result image in inch
             font_name: font path and name of texts on image
         """
-        fd = FreqDist(self.__filtered_tokens__)
+        fd = self.freq_dist()
         if len(args) == 0:
             args = [len(fd)]
         samples = [item for item, _ in fd.most_common(*args)]
@@ -201,7 +332,7 @@ class PersianText:
             width_inch, height_inch: width and height of the result image in inch
             font_name: font path and name of texts on image
         """
-        fd = FreqDist(self.__filtered_tokens__)
+        fd = self.freq_dist()
         if len(args) == 0:
             args = [len(fd)]
         samples = [item for item, _ in fd.most_common(*args)]
@@ -283,10 +414,135 @@ class PersianText:
         return
 
     def plot(self, *args, **kwargs):
-        fd = FreqDist(self.__filtered_tokens__)
+        fd = self.freq_dist()
         fd.plot(*args, **kwargs)
         return
 
+    def freq_dist(self):
+        """
+        Returns FreqDist of filtered tokens, which barchart, treemap and plot draw.
+        """
+        return FreqDist(self.__filtered_tokens__)
+
+
+class SpaceSaving:
+    """
+    Top-k counter of the Space-Saving algorithm: keeps at most k words in memory, whatever the number of distinct words.
+    Counts of frequent words are exact or overestimated by at most error(word).
+    """
+    def __init__(self, k):
+        self.k = k
+        self.__counts__ = {}
+        self.__errors__ = {}
+        # (count, word) entries; entries whose count is not the current count of word are stale.
+        self.__heap__ = []
+
+    def update(self, words):
+        # counting a chunk first makes an eviction per distinct word instead of per occurrence.
+        for word, count in Counter(words).items():
+            if word in self.__counts__:
+                self.__counts__[word] += count
+            elif len(self.__counts__) < self.k:
+                self.__counts__[word] = count
+                self.__errors__[word] = 0
+            else:
+                min_count, min_word = self._pop_min()
+                del self.__counts__[min_word]
+                del self.__errors__[min_word]
+                self.__counts__[word] = min_count + count
+                self.__errors__[word] = min_count
+            heapq.heappush(self.__heap__, (self.__counts__[word], word))
+        if len(self.__heap__) > 4 * self.k:
+            self.__heap__ = [(count, word) for word, count in self.__counts__.items()]
+            heapq.heapify(self.__heap__)
+        return
+
+    def _pop_min(self):
+        while True:
+            count, word = heapq.heappop(self.__heap__)
+            if self.__counts__.get(word) == count:
+                return count, word
+
+    def error(self, word):
+        return self.__errors__.get(word, 0)
+
+    def items(self):
+        return self.__counts__.items()
+
+    def most_common(self, n=None):
+        return Counter(self.__counts__).most_common(n)
+
+
+class StreamingPersianText(PersianText):
+    """
+    PersianText of many documents (e.g. ad descriptions), read from an iterator chunksize documents at a time.
+    filter_tokens tokenizes and filters each chunk and keeps only the counts of filtered tokens, so memory does not
+    grow with the number of documents. top_k: keep at most top_k words by SpaceSaving, for very many distinct words.
+
+        StreamingPersianText(descriptions).replace([('\n', ' ')]).filter_tokens(language='fa', min_len=2, reshape=True).barchart(30)
+    """
+    def __init__(self, texts, chunksize=1000, top_k=None):
+        super().__init__('')
+        self.__texts__ = texts
+        self.__chunksize__ = chunksize
+        self.__replace_pairs__ = []
+        self.__counter__ = SpaceSaving(top_k) if top_k else Counter()
+        self.__reshape__ = False
+        self.__stop_words__ = None
+        self.documents = 0
+
+    def replace(self, find_replace_pairs):
+        self.__replace_pairs__.extend(find_replace_pairs)
+        return self
+
+    def reload(self):
+        """
+        Forgets the replace pairs, like PersianText.reload drops replacements of its text. documents of a stream are
+        read once, so tokens which are already counted are kept.
+        """
+        self.__replace_pairs__ = []
+
+    def tokenize(self, stop_words=None):
+        self.__stop_words__ = stop_words
+        return self
+
+    def filter_tokens(self, pos_tags=None, stop_words=None, include_words=None, min_len=1, max_len=100, language=None, reshape=False):
+        """
+        Reads all documents and counts their tokens which pass the filters. arguments are those of PersianText.filter_tokens.
+        """
+        if self.__stop_words__:
+            # stop words of tokenize are one list, those of filter_tokens are lists of lists.
+            stop_words = list(stop_words or []) + [self.__stop_words__]
+        token_filter = TokenFilter(pos_tags=pos_tags, stop_words=stop_words, include_words=include_words,
+                                   min_len=min_len, max_len=max_len, language=language)
+        iterator = iter(self.__texts__)
+        while True:
+            chunk = list(itertools.islice(iterator, self.__chunksize__))
+            if not chunk:
+                break
+            self.documents += len(chunk)
+            text = PersianText('\n'.join(t for t in chunk if isinstance(t, str))).replace(self.__replace_pairs__)
+            text.filter_tokens(token_filter=token_filter)
+            self.__counter__.update(text.__filtered_tokens__)
+        self.__reshape__ = reshape
+        return self
+
+    def reshape_filtered_tokens(self):
+        self.__reshape__ = True
+        return
+
+    def freq_dist(self):
+        fd = FreqDist()
+        for token, count in self.__counter__.items():
+            if self.__reshape__:
+                # tokens which get_display can not handle are left out, like PersianText.reshape_filtered_tokens does.
+                try:
+                    token = _reshape_cached(token)
+                except AssertionError:
+                    continue
+            fd[token] += count
+        return fd
+
 
 
 
@@ -0,0 +1,101 @@
+"""
+Turns the relative publish time of posts (post_date, e.g. 'دیروز در اصفهان، جلفا') into absolute dates.
+
+    >>> post_dates.relative_minutes('۳ ساعت پیش در اصفهان، جلفا')
+    180
+    >>> post_dates.parse_post_dates(df['post_date'], df['get_date'])
+       post_age_minutes  post_gdate  post_jdate
+    0              1440  2020-06-13    13990324
+
+get_date only has the day of the crawl, so a post of a few hours ago is dated on the crawl day.
+Ages of weeks and months are as precise as divar.ir shows them.
+"""
+import re
+import numpy as np
+import pandas as pd
+import jalali
+
+__DAY__ = 24 * 60
+
+# (phrase, minutes). {n} in a phrase is a number in Persian or Latin digits, which multiplies the minutes.
+# phrases with a number come first, so '۲ هفته پیش' is not read as 'هفته پیش'.
+RELATIVE_DATES = (
+    ('{n} دقیقه پیش', 1),
+    ('{n} ساعت پیش', 60),
+    ('{n} روز پیش', __DAY__),
+    ('{n} هفته پیش', 7 * __DAY__),
+    ('{n} ماه پیش', 30 * __DAY__),
+    ('لحظاتی پیش', 0),
+    ('دقایقی پیش', 5),
+    ('ربع ساعت پیش', 15),
+    ('نیم ساعت پیش', 30),
+    ('ساعاتی پیش', 2 * 60),
+    ('امروز', 0),
+    ('پریروز', 2 * __DAY__),
+    ('دیروز', __DAY__),
+    ('هفتهٔ پیش', 7 * __DAY__),
+    ('هفته پیش', 7 * __DAY__),
+    ('ماه پیش', 30 * __DAY__),
+)
+
+PERSIAN_DIGITS_TABLE = str.maketrans('۰۱۲۳۴۵۶۷۸۹', '0123456789')
+
+def _compile(table):
+    # one alternation of all phrases; the name of the matching group is the index of its phrase.
+    parts = []
+    for i, (phrase, _) in enumerate(table):
+        pattern = re.escape(phrase).replace(re.escape('{n}'), r'(?P<n{}>[0-9۰-۹]+)'.format(i))
+        parts.append('(?P<p{}>{})'.format(i, pattern))
+    return re.compile('|'.join(parts))
+
+__PATTERN__ = _compile(RELATIVE_DATES)
+
+def relative_minutes(text):
+    """
+    Returns age of a post in minutes from its post_date (or a listing card text), or None if it has no known phrase.
+    """
+    if not isinstance(text, str):
+        return None
+    m = __PATTERN__.search(text)
+    if m is None:
+        return None
+    i = int(m.lastgroup[1:])
+    minutes = RELATIVE_DATES[i][1]
+    n = m.group('n{}'.format(i)) if '{n}' in RELATIVE_DATES[i][0] else None
+    return minutes * int(n.translate(PERSIAN_DIGITS_TABLE)) if n else minutes
+
+def is_older(text, post_date_before):
+    """
+    Returns True if text shows a post as old as post_date_before (e.g. 'دیروز') or older.
+    If post_date_before is not a known phrase, it is looked up in text as is.
+    """
+    limit = relative_minutes(post_date_before)
+    if limit is None:
+        return post_date_before in text
+    minutes = relative_minutes(text)
+    return minutes is not None and minutes >= limit
+
+def parse_post_dates(post_date, get_date):
+    """
+    Returns a DataFrame, with the index of post_date, of:
+        post_age_minutes: age of the post when it was crawled, NaN if post_date has no known phrase.
+        post_gdate: Gregorian date of the post (datetime64), NaT if it is not known.
+        post_jdate: Jalali date of the post as YYYYMMDD (nullable Int64), e.g. 13990324.
+    post_date, get_date: Series of post_date and get_date ('YYYY-MM-DD') of posts.
+    post_date holds a few dozen phrases like '۳ روز پیش', so relative_minutes runs once per phrase, not per post.
+    """
+    post_date = pd.Series(post_date)
+    codes, uniques = pd.factorize(post_date)
+    minutes = np.array([relative_minutes(text) for text in uniques] + [None], dtype='float')[codes]
+
+    get_day = pd.to_datetime(pd.Series(get_date, index=post_date.index), errors='coerce').to_numpy().astype('datetime64[D]')
+    days = np.floor(minutes / __DAY__)
+    known = ~np.isnat(get_day) & ~np.isnan(days)
+    post_gdate = np.where(known, get_day - np.where(known, days, 0).astype('int64'), np.datetime64('NaT'))
+
+    jy, jm, jd = jalali.gregorian_to_persian(post_gdate, errors='coerce')
+    known = ~np.isnan(jy)
+    post_jdate = pd.array(np.where(known, jalali.date_ints(np.nan_to_num(jy), np.nan_to_num(jm), np.nan_to_num(jd)), 0), dtype='Int64')
+    post_jdate[~known] = pd.NA
+    return pd.DataFrame({'post_age_minutes': minutes, 'post_gdate': post_gdate.astype('datetime64[ns]'), 'post_jdate': post_jdate},
+                        index=post_date.index)
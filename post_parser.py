@@ -0,0 +1,141 @@
+from bs4 import BeautifulSoup
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    try:
+        # selectolax < 0.3 has only the modest backend.
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        HTMLParser = None
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+# >>>>>>>>>> backends <<<<<<<<<<
+# every backend returns texts exactly like BeautifulSoup's .text (all descendant text nodes, concatenated).
+
+class SoupBackend:
+    name = 'bs4'
+
+    def document(self, html):
+        return BeautifulSoup(html, 'html.parser')
+
+    def first_text(self, doc, tag, class_name):
+        node = doc.find(tag, class_=class_name)
+        return None if node is None else node.text
+
+    def all_texts(self, doc, tag, class_name):
+        return [node.text for node in doc.find_all(tag, class_=class_name)]
+
+    def fields(self, doc):
+        for pf in doc.find_all('div', class_='post-fields-item'):
+            if pf.span is None:
+                continue
+            yield pf.span.text, pf.div.text if pf.div else pf.a.text if pf.a else None
+
+class SelectolaxBackend:
+    name = 'selectolax'
+
+    def document(self, html):
+        return HTMLParser(html)
+
+    def first_text(self, doc, tag, class_name):
+        node = doc.css_first('{}.{}'.format(tag, class_name))
+        return None if node is None else node.text()
+
+    def all_texts(self, doc, tag, class_name):
+        return [node.text() for node in doc.css('{}.{}'.format(tag, class_name))]
+
+    @staticmethod
+    def first_descendant(node, tag):
+        # like bs4's node.tag: the first descendant in document order, the node itself excluded.
+        for child in node.iter():
+            if child.tag == tag:
+                return child
+            found = SelectolaxBackend.first_descendant(child, tag)
+            if found is not None:
+                return found
+        return None
+
+    def fields(self, doc):
+        for pf in doc.css('div.post-fields-item'):
+            span = self.first_descendant(pf, 'span')
+            if span is None:
+                continue
+            div = self.first_descendant(pf, 'div')
+            a = self.first_descendant(pf, 'a') if div is None else None
+            yield span.text(), div.text() if div is not None else a.text() if a is not None else None
+
+class LxmlBackend:
+    name = 'lxml'
+
+    @staticmethod
+    def class_xpath(tag, class_name):
+        return ".//{}[contains(concat(' ', normalize-space(@class), ' '), ' {} ')]".format(tag, class_name)
+
+    def document(self, html):
+        try:
+            return lxml.html.document_fromstring(html, parser=lxml.html.HTMLParser(encoding='utf-8'))
+        except etree.ParserError:
+            # empty documents
+            return lxml.html.document_fromstring('<html></html>')
+
+    def first_text(self, doc, tag, class_name):
+        nodes = doc.xpath(self.class_xpath(tag, class_name))
+        return nodes[0].text_content() if nodes else None
+
+    def all_texts(self, doc, tag, class_name):
+        return [node.text_content() for node in doc.xpath(self.class_xpath(tag, class_name))]
+
+    def fields(self, doc):
+        for pf in doc.xpath(self.class_xpath('div', 'post-fields-item')):
+            span = pf.find('.//span')
+            if span is None:
+                continue
+            div = pf.find('.//div')
+            a = pf.find('.//a') if div is None else None
+            yield span.text_content(), div.text_content() if div is not None else a.text_content() if a is not None else None
+
+PARSER_BACKENDS = {'bs4': SoupBackend}
+if lxml is not None:
+    PARSER_BACKENDS['lxml'] = LxmlBackend
+if HTMLParser is not None:
+    PARSER_BACKENDS['selectolax'] = SelectolaxBackend
+
+# the fastest installed backend is the default.
+DEFAULT_BACKEND = 'selectolax' if 'selectolax' in PARSER_BACKENDS else 'lxml' if 'lxml' in PARSER_BACKENDS else 'bs4'
+
+# >>>>>>>>>> functions <<<<<<<<<<
+
+def get_backend(name=None):
+    """
+    name: 'selectolax', 'lxml' or 'bs4'. DEFAULT_BACKEND is used if it is None.
+    """
+    name = DEFAULT_BACKEND if name is None else name
+    if name not in PARSER_BACKENDS:
+        raise ValueError('parser backend {} is not installed. available backends: {}'.format(name, ', '.join(PARSER_BACKENDS)))
+    return PARSER_BACKENDS[name]()
+
+def parse_post_page(html, post_values, backend=None):
+    """
+    Adds post_date, main_category, sub_category and post-fields-item values of a post page to post_values.
+    backend: a backend object of get_backend(). the default backend is used if it is None.
+    Parsing stops silently if there is no publish time in the page, like the BeautifulSoup code of get_post_info did.
+    """
+    backend = get_backend() if backend is None else backend
+    doc = backend.document(html)
+    post_date = backend.first_text(doc, 'span', 'post-header__publish-time')
+    if post_date is None:
+        return post_values
+    post_values['post_date'] = post_date
+    post_types = backend.all_texts(doc, 'div', 'section')
+    if post_types:
+        post_values['main_category'] = post_types[-2]
+        post_values['sub_category'] = post_types[-1]
+    for name, value in backend.fields(doc):
+        post_values[name] = value
+    return post_values
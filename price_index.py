@@ -0,0 +1,167 @@
+"""
+Time series of unit prices per snapshot, in a SQLite file.
+
+Each ingested snapshot (a day's crawl of a city) adds one row per measure (sell_unit_price or rent_unit_price),
+sub_category and location with the count, mean, median and quantiles of the measure, so a trend over months is read
+from a few hundred rows instead of preparing the datasets of every day again.
+
+    >>> with price_index.PriceIndex('./data/price_index.sqlite') as index:
+    ...     index.add_snapshot('isfahan', '13990330', df_sell, df_rent)
+    ...     trend = index.trend('isfahan', 'sell_unit_price', location='جلفا', sub_category='آپارتمان')
+    >>> trend.columns
+    Index(['date', 'count', 'mean', 'p10', 'p25', 'median', 'p75', 'p90'], dtype='object')
+
+Rows with an empty location (ALL) are aggregates of the whole city, and likewise for sub_category.
+"""
+import sqlite3
+import numpy as np
+import pandas as pd
+import jalali
+
+INDEX_VERSION = 1
+
+ALL = ''
+MEASURES = {'sell_unit_price': 'فروش', 'rent_unit_price': 'اجاره'}
+QUANTILES = {'p10': 0.10, 'p25': 0.25, 'median': 0.50, 'p75': 0.75, 'p90': 0.90}
+STATS = ('count', 'mean') + tuple(QUANTILES)
+
+__SCHEMA__ = """
+CREATE TABLE IF NOT EXISTS price_index (
+    city TEXT NOT NULL,
+    measure TEXT NOT NULL,
+    sub_category TEXT NOT NULL,
+    location TEXT NOT NULL,
+    snapshot TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    mean REAL, p10 REAL, p25 REAL, median REAL, p75 REAL, p90 REAL,
+    PRIMARY KEY (city, measure, sub_category, location, snapshot)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    city TEXT NOT NULL,
+    snapshot TEXT NOT NULL,
+    posts INTEGER NOT NULL,
+    PRIMARY KEY (city, snapshot)
+) WITHOUT ROWID;
+"""
+
+def aggregate(data, measure):
+    """
+    Returns a DataFrame of the stats of `measure` for each (sub_category, location) of data (df_sell or df_rent),
+    and for each sub_category, each location and all of data, with ALL for the aggregated column.
+    """
+    columns = ['sub_category', 'location', measure]
+    data = data[columns].dropna().astype({'sub_category': str, 'location': str})
+    frames = []
+    for by in (['sub_category', 'location'], ['sub_category'], ['location'], []):
+        # one group of all rows is a constant key, as groupby needs at least one key.
+        keys = by or [np.zeros(len(data), dtype='int8')]
+        grouped = data.groupby(keys, sort=False)[measure]
+        stats = pd.DataFrame({'count': grouped.size(), 'mean': grouped.mean()})
+        for name, q in QUANTILES.items():
+            stats[name] = grouped.quantile(q)
+        stats = stats.reset_index(drop=not by)
+        for col in ('sub_category', 'location'):
+            if col not in by:
+                stats[col] = ALL
+        frames.append(stats[['sub_category', 'location'] + list(STATS)])
+    return pd.concat(frames, ignore_index=True)
+
+def snapshot_dates(snapshots):
+    """
+    Returns datetime64 array of the Gregorian dates of snapshots (jalali dates as YYYYMMDD), NaT for invalid ones.
+    """
+    snapshots = pd.to_numeric(pd.Series(snapshots, dtype=object), errors='coerce').fillna(0).to_numpy(dtype='int64')
+    gy, gm, gd = jalali.persian_to_gregorian(snapshots, errors='coerce')
+    return pd.to_datetime(pd.DataFrame({'year': gy, 'month': gm, 'day': gd}), errors='coerce').to_numpy()
+
+def ingested_snapshots(db, city):
+    """
+    Returns sorted list of the snapshots of a city in the snapshots table of a SQLite connection.
+    """
+    rows = db.execute('SELECT snapshot FROM snapshots WHERE city = ? ORDER BY snapshot', (city,))
+    return [snapshot for snapshot, in rows]
+
+def is_ingested(db, city, snapshot):
+    return db.execute('SELECT 1 FROM snapshots WHERE city = ? AND snapshot = ?', (city, snapshot)).fetchone() is not None
+
+class PriceIndex:
+    def __init__(self, file_path):
+        self.__file_path__ = file_path
+        self.__db__ = None
+
+    def open(self):
+        self.__db__ = sqlite3.connect(self.__file_path__)
+        self.__db__.executescript(__SCHEMA__)
+        version = self.__db__.execute('PRAGMA user_version').fetchone()[0]
+        if version == 0:
+            self.__db__.execute('PRAGMA user_version = {}'.format(INDEX_VERSION))
+        elif version != INDEX_VERSION:
+            self.close()
+            raise ValueError('{} is a price index of another version'.format(self.__file_path__))
+        return self
+
+    def add_snapshot(self, city, snapshot, df_sell, df_rent):
+        """
+        Adds the stats of a snapshot (jalali date as YYYYMMDD), replacing the ones of an earlier ingest of it.
+        df_sell, df_rent: datasets of split_sell_rent.
+        """
+        rows = []
+        for measure, data in (('sell_unit_price', df_sell), ('rent_unit_price', df_rent)):
+            stats = aggregate(data, measure)
+            rows.extend((city, measure, sub_category, location, snapshot, int(count), *values)
+                        for sub_category, location, count, *values in stats.itertuples(index=False, name=None))
+        with self.__db__:
+            self.__db__.execute('DELETE FROM price_index WHERE city = ? AND snapshot = ?', (city, snapshot))
+            self.__db__.executemany('INSERT INTO price_index VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self.__db__.execute('INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)', (city, snapshot, len(df_sell) + len(df_rent)))
+        return len(rows)
+
+    def snapshots(self, city):
+        """
+        Returns sorted list of ingested snapshots of a city.
+        """
+        return ingested_snapshots(self.__db__, city)
+
+    def has_snapshot(self, city, snapshot):
+        return is_ingested(self.__db__, city, snapshot)
+
+    def locations(self, city, measure, sub_category=ALL, min_count=1):
+        """
+        Returns locations with at least min_count posts in all snapshots, most posts first.
+        """
+        rows = self.__db__.execute('SELECT location, SUM(count) AS posts FROM price_index '
+                                   'WHERE city = ? AND measure = ? AND sub_category = ? AND location != ? '
+                                   'GROUP BY location HAVING posts >= ? ORDER BY posts DESC',
+                                   (city, measure, sub_category, ALL, min_count))
+        return [location for location, _ in rows]
+
+    def trend(self, city, measure, location=ALL, sub_category=ALL, start=None, end=None):
+        """
+        Returns the stats of a location and sub_category (the whole city and all sub categories by default)
+        in each snapshot, indexed by snapshot, with the Gregorian date of each snapshot in a 'date' column.
+        start, end: first and last snapshots, e.g. '13990301'.
+        """
+        query = 'SELECT snapshot, {} FROM price_index WHERE city = ? AND measure = ? AND sub_category = ? AND location = ?'.format(', '.join(STATS))
+        params = [city, measure, sub_category, location]
+        if start is not None:
+            query += ' AND snapshot >= ?'
+            params.append(str(start))
+        if end is not None:
+            query += ' AND snapshot <= ?'
+            params.append(str(end))
+        trend = pd.read_sql_query(query + ' ORDER BY snapshot', self.__db__, params=params, index_col='snapshot')
+        trend.insert(0, 'date', snapshot_dates(trend.index))
+        return trend
+
+    def close(self):
+        if self.__db__ is not None:
+            self.__db__.close()
+            self.__db__ = None
+        return
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
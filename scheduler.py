@@ -0,0 +1,131 @@
+"""
+Crawls many (city, category) listings in parallel processes.
+
+    python scheduler.py --cities isfahan mashhad shiraz karaj --categories real-estate --processes 4 --rate 4
+
+Each job writes the same files as divar.py: ./data/{city}--{category}--{jalali date}.url and the items file.
+The rate budget (requests per second to divar.ir) is shared between processes, so the total rate
+does not depend on the number of processes.
+"""
+import os
+import time
+import threading
+import itertools
+import multiprocessing
+from datetime import datetime
+from divar import Divar
+import jalali
+
+class CrawlJob:
+    def __init__(self, city, category, collect_urls=True, incremental=False, max_pages=3000, items_format='jsonl'):
+        """
+        collect_urls: collect post urls before crawling. if False, an existing .url file is crawled.
+        incremental: collect only posts which are not collected in previous runs (see Divar.get_posts_url).
+        items_format: 'jsonl' for the append-only items file, 'json' for a single JSON array.
+        """
+        self.city = city
+        self.category = category
+        self.collect_urls = collect_urls
+        self.incremental = incremental
+        self.max_pages = max_pages
+        self.items_format = items_format
+
+    @property
+    def name(self):
+        return '{}--{}'.format(self.city, self.category)
+
+    def file_paths(self, jd, data_dir='./data'):
+        urls_file_path = os.path.join(data_dir, '{}--{}.url'.format(self.name, jd))
+        items_file_path = os.path.join(data_dir, '{}--{}.{}'.format(self.name, jd, self.items_format))
+        return urls_file_path, items_file_path
+
+def run_job(job, rate, workers, progress_queue, report_every=50):
+    """
+    Runs one job in a worker process. Returns (job name, number of fetched posts, seconds, error).
+    """
+    start = time.time()
+    fetched = [0]
+
+    def progress(done, total):
+        fetched[0] = done
+        if done % report_every == 0 or done == total:
+            progress_queue.put((job.name, done, total))
+        return
+
+    try:
+        gd = str(datetime.now().date())
+        jd = jalali.Gregorian(gd).persian_string(date_format='{}{:02d}{:02d}')
+        urls_file_path, items_file_path = job.file_paths(jd)
+        divar = Divar(city=job.city, category=job.category)
+        if job.collect_urls:
+            progress_queue.put((job.name, 0, None))
+            divar.get_posts_url(max_pages=job.max_pages, file_path=urls_file_path, rate=rate,
+                                incremental=job.incremental, verbose=False)
+        if not os.path.exists(urls_file_path):
+            return job.name, 0, time.time() - start, '{} not found'.format(urls_file_path)
+        divar.browse_and_save_items(urls_file_path=urls_file_path, items_file_path=items_file_path,
+                                    workers=workers, rate=rate, progress=progress, verbose=False)
+    except Exception as e:
+        return job.name, fetched[0], time.time() - start, repr(e)
+    return job.name, fetched[0], time.time() - start, None
+
+def _run_job(task):
+    return run_job(*task)
+
+def report_progress(progress_queue):
+    while True:
+        message = progress_queue.get()
+        if message is None:
+            return
+        name, done, total = message
+        if total is None:
+            print('** {}: collecting urls ...'.format(name))
+        else:
+            print('** {}: {}/{} posts'.format(name, done, total))
+
+def run_jobs(jobs, processes=2, rate=4, workers=4):
+    """
+    Runs jobs in at most `processes` processes and prints progress of each job.
+    rate: total requests per second of all processes. it is divided evenly between processes.
+    workers: threads of each process fetching posts.
+    Returns list of (job name, number of fetched posts, seconds, error), in the order jobs finish.
+    """
+    processes = max(1, min(processes, len(jobs)))
+    process_rate = rate / processes if rate else None
+    manager = multiprocessing.Manager()
+    progress_queue = manager.Queue()
+    reporter = threading.Thread(target=report_progress, args=(progress_queue,), daemon=True)
+    reporter.start()
+
+    results = []
+    with multiprocessing.Pool(processes=processes) as pool:
+        tasks = [(job, process_rate, workers, progress_queue) for job in jobs]
+        for result in pool.imap_unordered(_run_job, tasks):
+            results.append(result)
+    progress_queue.put(None)
+    reporter.join()
+    manager.shutdown()
+
+    for name, fetched, seconds, error in results:
+        status = 'ERROR: {}'.format(error) if error else 'done'
+        print('*** {}: {} posts in {:.0f} s, {}'.format(name, fetched, seconds, status))
+    return results
+
+# --------------------------------------------------------------------------
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cities', nargs='+', default=['isfahan'])
+    parser.add_argument('--categories', nargs='+', default=['real-estate'])
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--rate', type=float, default=4, help='total requests per second')
+    parser.add_argument('--workers', type=int, default=4, help='threads per process')
+    parser.add_argument('--max-pages', type=int, default=3000)
+    parser.add_argument('--no-collect', action='store_true', help='crawl existing .url files only')
+    parser.add_argument('--incremental', action='store_true', help='collect only posts which are not collected before')
+    parser.add_argument('--format', choices=['jsonl', 'json'], default='jsonl')
+    args = parser.parse_args()
+
+    jobs = [CrawlJob(city, category, collect_urls=not args.no_collect, incremental=args.incremental, max_pages=args.max_pages, items_format=args.format)
+            for city, category in itertools.product(args.cities, args.categories)]
+    run_jobs(jobs, processes=args.processes, rate=args.rate, workers=args.workers)
@@ -1,18 +1,108 @@
-from requests import get
+import time
+import importlib.util
+import threading
+from urllib.parse import urlparse
+from requests import Session
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
+from urllib3.util.retry import Retry
 from contextlib import closing
 from bs4 import BeautifulSoup
 from PIL import Image
 from io import BytesIO
 
-def simple_get(url, timeout=15):
+# requests decodes brotli responses only when the brotli package is installed.
+ACCEPT_ENCODING = 'gzip, deflate, br' if importlib.util.find_spec('brotli') is not None else 'gzip, deflate'
+
+__SESSION__ = None
+__SESSION_LOCK__ = threading.Lock()
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. `rate` is the number of tokens added per second
+    and `burst` is the maximum number of tokens that can be saved up.
+    It is safe to share one bucket between threads.
+    """
+    def __init__(self, rate, burst=1):
+        self.__rate__ = float(rate)
+        self.__capacity__ = max(1.0, float(burst))
+        self.__tokens__ = self.__capacity__
+        self.__last__ = time.monotonic()
+        self.__lock__ = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.__lock__:
+                now = time.monotonic()
+                self.__tokens__ = min(self.__capacity__, self.__tokens__ + (now - self.__last__) * self.__rate__)
+                self.__last__ = now
+                if self.__tokens__ >= 1:
+                    self.__tokens__ -= 1
+                    return
+                wait = (1 - self.__tokens__) / self.__rate__
+            time.sleep(wait)
+
+class RateLimiter:
+    """
+    Keeps one TokenBucket per host, so requests to each host are limited to
+    `rate` requests per second independently.
+    """
+    def __init__(self, rate, burst=1):
+        self.__rate__ = rate
+        self.__burst__ = burst
+        self.__buckets__ = {}
+        self.__lock__ = threading.Lock()
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        with self.__lock__:
+            bucket = self.__buckets__.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.__rate__, self.__burst__)
+                self.__buckets__[host] = bucket
+        bucket.acquire()
+        return
+
+def create_session(pool_size=10, retries=3, backoff_factor=0.5):
+    """
+    Returns a requests.Session that keeps connections alive and reuses them.
+    pool_size: number of connections kept open per host. it should not be less than the number of threads using the session.
+    retries: number of retries on connection errors and 429/5xx responses.
+    backoff_factor: retries wait backoff_factor * (2 ** (retry number - 1)) seconds, or Retry-After if the server sends it.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_factor,
+                  status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept-Encoding': ACCEPT_ENCODING, 'Connection': 'keep-alive'})
+    return session
+
+def get_session():
+    """
+    Returns the session shared by all simple_get calls which do not pass their own session.
+    """
+    global __SESSION__
+    with __SESSION_LOCK__:
+        if __SESSION__ is None:
+            __SESSION__ = create_session()
+    return __SESSION__
+
+def simple_get(url, timeout=15, rate_limiter=None, session=None):
     """
     Attempts to get the content at `url` by making an HTTP GET request.
     If the content-type of response is some kind of HTML/XML, return the
     text content, otherwise return None.
+    rate_limiter: an optional RateLimiter which is waited on before the request.
+    session: the session used for the request. the shared session of get_session() is used if it is None.
     """
+    if rate_limiter is not None:
+        rate_limiter.acquire(url)
+    if session is None:
+        session = get_session()
     try:
-        with closing(get(url, stream=True, timeout=timeout)) as resp:
+        with closing(session.get(url, timeout=timeout)) as resp:
             if is_good_response(resp):
                 return resp.content
             else:
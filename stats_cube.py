@@ -0,0 +1,135 @@
+"""
+Aggregation cube of a prepared dataset (df_total, df_sell or df_rent of prepare_datasets).
+
+All counts and means drawn by the charts are roll-ups of one groupby over every dimension the charts use,
+so a dataset is scanned once per figure instead of once per panel, and a saved cube redraws the charts
+without the rows. A small sample of rows is kept for the point-cloud panel.
+"""
+import numpy as np
+import pandas as pd
+
+CUBE_VERSION = 1
+
+DIMENSIONS = ('ad_type', 'sub_category', 'location', 'area_cat', 'age_cat', 'sell_unit_price_cat', 'rent_unit_price_cat')
+MEASURES = ('age', 'area', 'sell_unit_price', 'rent_unit_price')
+IN_RANGE = 'in_range'
+
+class StatsCube:
+    def __init__(self, cells, categories, limits=None, points=None, points_sampled=False):
+        """
+        cells: one row per observed combination of dimensions, with 'size' and '{measure}_sum', '{measure}_count' columns.
+        categories: {dimension: all categories} of categorical dimensions, in their order.
+        limits: {measure: max value} of the in_range dimension.
+        points: rows for point-cloud charts, a stratified sample if points_sampled.
+        """
+        self.cells = cells
+        self.categories = categories
+        self.limits = limits or {}
+        self.points = points
+        self.points_sampled = points_sampled
+
+    @property
+    def dimensions(self):
+        return [col for col in self.cells.columns if col in DIMENSIONS or col == IN_RANGE]
+
+    @property
+    def measures(self):
+        return [col[:-len('_sum')] for col in self.cells.columns if col.endswith('_sum')]
+
+    @staticmethod
+    def from_frame(data, limits=None, point_columns=None, max_points=None, sample=None):
+        """
+        limits: {measure: max value}. rows whose measures are all within limits have in_range True, so charts
+        can leave out outliers, like data[data['sell_unit_price'] <= max_unit_price] does.
+        point_columns: columns of rows kept as points. if there are more than max_points in-range rows,
+        sample(rows, max_points) chooses them.
+        """
+        limits = limits or {}
+        dims = [col for col in DIMENSIONS if col in data.columns]
+        measures = [col for col in MEASURES if col in data.columns]
+        in_range = pd.Series(True, index=data.index)
+        for col, max_value in limits.items():
+            in_range &= (data[col] <= max_value).fillna(False)
+
+        frame = data[dims].copy()
+        frame[IN_RANGE] = in_range
+        for col in measures:
+            frame[col + '_sum'] = data[col].astype('float')
+            frame[col + '_count'] = data[col].notna().astype('int64')
+        frame['size'] = 1
+        cells = frame.groupby(by=dims + [IN_RANGE], observed=True, dropna=False, sort=False).sum().reset_index()
+
+        categories = {col: data[col].dtype for col in dims if isinstance(data[col].dtype, pd.CategoricalDtype)}
+        points, points_sampled = None, False
+        if point_columns:
+            points = data.loc[in_range.to_numpy(), list(point_columns)]
+            if max_points is not None and len(points) > max_points:
+                points, points_sampled = sample(points, max_points), True
+        return StatsCube(cells, categories, limits, points, points_sampled)
+
+    def _select(self, where):
+        cells = self.cells
+        for col, value in (where or {}).items():
+            cells = cells[cells[col] == value]
+        return cells
+
+    def _reindex(self, result, by, full):
+        if not full:
+            return result
+        if len(by) == 1:
+            if by[0] not in self.categories:
+                return result
+            dtype = self.categories[by[0]]
+            return result.reindex(pd.CategoricalIndex(dtype.categories, dtype=dtype, name=by[0]))
+        # all categories of categorical dimensions, and the observed values of the others.
+        levels = []
+        for i, col in enumerate(by):
+            if col in self.categories:
+                dtype = self.categories[col]
+                levels.append(pd.CategoricalIndex(dtype.categories, dtype=dtype, name=col))
+            else:
+                levels.append(result.index.levels[i])
+        return result.reindex(pd.MultiIndex.from_product(levels, names=list(by)))
+
+    def _group(self, cells, by):
+        # roll-ups group by dtypes of the cells, so categorical dimensions stay in their category order.
+        return cells.groupby(by=list(by), observed=True, sort=True)
+
+    def counts(self, by, where=None, full=False, column=None):
+        """
+        Number of rows of each combination of `by` dimensions, rows with a missing value of them are left out.
+        where: {dimension: value} to select rows, e.g. {'in_range': True}.
+        full: include all categories of categorical dimensions, with 0 for unobserved combinations.
+        column: count the non-null values of a dimension or measure instead of rows, like data.groupby(by).count()[column].
+        """
+        cells = self._select(where)
+        values = 'size'
+        if column in self.measures:
+            values = column + '_count'
+        elif column is not None:
+            cells = cells[cells[column].notna()]
+        result = self._group(cells, by)[values].sum().rename('size')
+        result = self._reindex(result, by, full)
+        return result.fillna(0).astype('int64') if full else result
+
+    def means(self, measure, by, where=None, full=False):
+        """
+        Mean of a measure for each combination of `by` dimensions, missing values of the measure are left out.
+        full: include all categories of categorical dimensions, with NaN for unobserved combinations.
+        """
+        sums = self._group(self._select(where), by)[[measure + '_sum', measure + '_count']].sum()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = sums[measure + '_sum'] / sums[measure + '_count'].replace(0, np.nan)
+        return self._reindex(result.rename(measure), by, full)
+
+    def save(self, file_path):
+        pd.to_pickle({'version': CUBE_VERSION, 'cells': self.cells, 'categories': self.categories, 'limits': self.limits,
+                      'points': self.points, 'points_sampled': self.points_sampled}, file_path)
+        return
+
+    @staticmethod
+    def load(file_path):
+        state = pd.read_pickle(file_path)
+        if state.get('version') != CUBE_VERSION:
+            raise ValueError('{} is a cube of another version'.format(file_path))
+        return StatsCube(state['cells'], state['categories'], state['limits'], state['points'], state['points_sampled'])